@@ -1,19 +1,52 @@
-from PyQt5 import QtCore, QtWidgets
-from core.config import WEATHER_UPDATE_INTERVAL
-from services.locationService import LocationService
+import logging
+import threading
+import time
+from PyQt5 import QtCore, QtNetwork, QtWidgets
+from contracts.contracts import LocationData
+from core.config import ICON_WARM_UP, STARTUP_PAINT_BUDGET
+from core.exceptions import eprint, WeatherServerError
+from core.jobs import Job, JobRunner
+from core.metrics import metrics
+from core.ratelimit import BACKGROUND, USER, priority
+from core.scheduler import RefreshScheduler
+from services.cityIndex import CityIndex
 from core.style import load_style
-from services.weatherService import WeatherService
+from services.remoteService import create_services
 from widgets.centralWidget import CentralWidget, LocAndWeatherPayload
+from widgets.cityCompleter import CityCompleter
+from widgets.iconCache import icon_cache
 
-location_service = LocationService()
-location_service.fetch_current()
-weather_service = WeatherService()
+location_service, weather_service = create_services()
+job_runner = JobRunner()
+
+
+def load_weather(location: LocationData) -> LocAndWeatherPayload:
+    '''Fetch weather of location. Runs on a job worker.'''
+    return LocAndWeatherPayload(
+        location_data=location,
+        weather_data=weather_service.get(location),
+    )
+
+
+def load_ip_location() -> LocAndWeatherPayload:
+    '''Locate by ip, then fetch its weather. Runs on a job worker.'''
+    return load_weather(location_service.fetch_current())
+
+
+def load_city(city: str) -> LocAndWeatherPayload:
+    '''Locate city, then fetch its weather. Runs on a job worker.'''
+    return load_weather(location_service.fetch_by_city(city))
 
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, flags):
+    def __init__(self, flags, started_at: float | None = None):
         super().__init__(flags=flags)
 
+        # perf_counter at launch, first_paint is measured from it
+        self.startedAt = time.perf_counter() if started_at is None else started_at
+        self.firstPaint: float | None = None
+        self.shown = False
+
         self.setWindowFlag(QtCore.Qt.FramelessWindowHint)
         self.setAttribute(QtCore.Qt.WA_TranslucentBackground, True)
 
@@ -37,19 +70,150 @@ class MainWindow(QtWidgets.QMainWindow):
         layout: QtWidgets.QVBoxLayout = self.centralWidget.layout()
         layout.insertLayout(0, button_layout)
 
-        self.updateWeatherThread = UpdateWeatherThread()
-        self.updateWeatherThread.updated.connect(self.centralWidget.update)
-
-        self.updateWeatherTimer = QtCore.QTimer()
-        self.updateWeatherTimer.setInterval(WEATHER_UPDATE_INTERVAL)
-        self.updateWeatherTimer.timeout.connect(self.updateWeatherThread.start)
-        self.updateWeatherTimer.start()
-
-        QtCore.QTimer.singleShot(300, self.updateWeatherThread.start)
+        self.refreshScheduler = RefreshScheduler()
+        self.location: LocationData | None = None
+
+        # emitted from job workers, delivered on the GUI thread
+        self.jobSignals = JobSignals(self)
+        self.jobSignals.finished.connect(self.on_job_finished)
+
+        # single shot, re-armed by the scheduler after every refresh
+        self.updateWeatherTimer = QtCore.QTimer(self)
+        self.updateWeatherTimer.setSingleShot(True)
+        self.updateWeatherTimer.timeout.connect(self.refresh_weather)
+
+        self.networkManager = QtNetwork.QNetworkConfigurationManager(self)
+        self.networkManager.onlineStateChanged.connect(self.on_online_state_changed)
+
+        if ICON_WARM_UP:
+            QtCore.QTimer.singleShot(0, icon_cache.warm_up)
+
+        # ready before the search dialog asks for suggestions
+        threading.Thread(target=CityIndex.shared, name='city-index', daemon=True).start()
+
+        # paint last run's weather before any network I/O, then locate by ip off the GUI thread
+        self.centralWidget.installEventFilter(self)
+        self.warm_start()
+        self.update_weather_with_ip_location()
+
+    def warm_start(self):
+        '''Show the last location found by ip and its cached weather, marked stale.'''
+        location = location_service.last_location()
+        if location is None:
+            return
+
+        self.location = location
+        weather = weather_service.cached(location)
+        if weather is None:
+            metrics.increment('startup.cold')
+            return
+
+        metrics.increment('startup.warm')
+        self.show_payload(LocAndWeatherPayload(location_data=location, weather_data=weather))
+
+    def show_payload(self, data: LocAndWeatherPayload):
+        self.location = data.location_data
+        self.centralWidget.update(data)
+        self.shown = True
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Paint and self.shown:
+            self.centralWidget.removeEventFilter(self)
+            self.on_first_paint()
+        return super().eventFilter(watched, event)
+
+    def on_first_paint(self):
+        elapsed = self.firstPaint = time.perf_counter() - self.startedAt
+        metrics.observe('startup.first_paint', elapsed)
+
+        logger = logging.getLogger('app')
+        fields = {'stage': 'startup', 'duration': elapsed}
+        if elapsed > STARTUP_PAINT_BUDGET:
+            logger.warning(
+                f'Startup: first paint after {elapsed * 1000:.0f} ms, '
+                f'budget {STARTUP_PAINT_BUDGET * 1000:.0f} ms', extra=fields)
+        else:
+            logger.info(f'Startup: first paint after {elapsed * 1000:.0f} ms', extra=fields)
+
+    def submit(self, key, function, *args, lane: int = USER) -> Job:
+        '''Run function off the GUI thread, superseding the pending weather job.
+
+        Its upstream calls queue for rate limits in priority lane.
+        '''
+        with priority(lane):
+            return job_runner.submit(
+                'weather', key, function, *args, callback=self.jobSignals.finished.emit)
+
+    def refresh_weather(self):
+        # a user action in flight brings fresh data and re-arms the timer anyway
+        if job_runner.pending('weather'):
+            return
+        if self.location is None:
+            self.update_weather_with_ip_location()
+            return
+        self.submit(('weather', self.location), load_weather, self.location, lane=BACKGROUND)
+
+    def refresh_now(self):
+        self.updateWeatherTimer.start(0)
+
+    def schedule_refresh(self):
+        delay = self.refreshScheduler.next_delay(
+            time.time(),
+            None if self.location is None else weather_service.expires_at(self.location),
+        )
+        self.updateWeatherTimer.start(int(delay * 1000))
+
+    def on_job_finished(self, job: Job):
+        if not job_runner.is_current(job):
+            metrics.increment('jobs.dropped')
+            return
+
+        error = job.future.exception()
+        if error is not None:
+            if not isinstance(error, WeatherServerError):
+                eprint(error)
+            self.on_weather_failed(error)
+            return
+
+        data = job.future.result()
+        self.show_payload(data)
+        self.on_weather_updated(data)
+
+    def on_weather_updated(self, data: LocAndWeatherPayload):
+        self.refreshScheduler.record(data.weather_data.flag)
+        self.schedule_refresh()
+
+    def on_weather_failed(self, error: Exception):
+        self.refreshScheduler.record(False)
+        self.schedule_refresh()
+
+    def on_online_state_changed(self, online: bool):
+        if online:
+            self.refreshScheduler.reset()
+            self.refresh_now()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refreshScheduler.set_visible(True)
+        self.refresh_now()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refreshScheduler.set_visible(False)
+        self.schedule_refresh()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            minimized = self.isMinimized()
+            self.refreshScheduler.set_visible(not minimized)
+            if minimized:
+                self.schedule_refresh()
+            else:
+                self.refresh_now()
 
     def update_weather_with_ip_location(self):
-        location_service.fetch_current()
-        self.updateWeatherThread.start()
+        self.submit(('ip',), load_ip_location)
 
     def search_city_weather(self):
         dialog = QtWidgets.QInputDialog(self)
@@ -57,12 +221,15 @@ class MainWindow(QtWidgets.QMainWindow):
         dialog.setLabelText('Enter city name:')
         dialog.setOkButtonText('Search')
         dialog.setCancelButtonText('Cancel')
+        dialog.setInputMode(QtWidgets.QInputDialog.TextInput)  # creates the line edit
+
+        completer = CityCompleter(location_service.city_index, dialog)
+        completer.attach(dialog.findChild(QtWidgets.QLineEdit))
 
         if dialog.exec_() == QtWidgets.QDialog.Accepted:
             city = dialog.textValue()
             if city:
-                location_service.fetch_by_city(city)
-                self.updateWeatherThread.start()
+                self.submit(('city', city.strip().casefold()), load_city, city)
 
     # used to move frameless window
     def mousePressEvent(self, event):
@@ -78,16 +245,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self._beginPos = event.globalPos()
 
 
-class UpdateWeatherThread(QtCore.QThread):
-    updated = QtCore.pyqtSignal(object)
-
-    def __init__(self):
-        super().__init__()
-
-    def run(self):
-        location = location_service.get_location()
-        self.updated.emit(
-            LocAndWeatherPayload(
-                location_data=location,
-                weather_data=weather_service.get(location)
-            ))
+class JobSignals(QtCore.QObject):
+    '''Carries finished jobs from job workers to the GUI thread.'''
+    finished = QtCore.pyqtSignal(object)
@@ -0,0 +1 @@
+'''Offline benchmarks. Run a module with `python -m benchmarks.<name>`.'''
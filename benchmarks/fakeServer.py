@@ -0,0 +1,180 @@
+
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from benchmarks.payloads import synthetic_forecast, synthetic_weather
+from core.breaker import CircuitBreaker
+from core.config import get_settings
+from core.ratelimit import RateLimiter
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+ICONS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'icons')
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    '''HTTP server that leaves out clients hanging up early, as deadlines and hedges do.'''
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def load_fixture(name: str) -> dict | list:
+    '''Return a stored api response from benchmarks/fixtures.'''
+    with open(os.path.join(FIXTURES_DIR, f'{name}.json'), 'r') as file:
+        return json.load(file)
+
+
+class FakeUpstream:
+    '''Local stand-in for ipinfo and OpenWeather with configurable latency and errors.
+
+    payloads is 'fixtures' for the stored real-shaped responses or 'synthetic'
+    for generated ones with forecast_entries steps. Icon files in icons are
+    served under /img/wn/. A stall_rate fraction of requests waits stall sec
+    more before answering.
+    '''
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        payloads: str = 'fixtures',
+        forecast_entries: int = 40,
+        etags: bool = False,
+        seed: int = 0,
+        icons: str = ICONS_DIR,
+        stall_rate: float = 0.0,
+        stall: float = 0.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.etags = etags
+        self.icons = icons
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.requests = 0
+        self.not_modified = 0
+
+        if payloads == 'fixtures':
+            self.payloads = {
+                'ipinfo': load_fixture('ipinfo'),
+                'weather': load_fixture('weather'),
+                'forecast': load_fixture('forecast'),
+                'geo': load_fixture('geo'),
+            }
+        else:
+            self.payloads = {
+                'ipinfo': load_fixture('ipinfo'),
+                'weather': synthetic_weather(seed=seed),
+                'forecast': synthetic_forecast(entries=forecast_entries, seed=seed),
+                'geo': load_fixture('geo'),
+            }
+
+        self.server = QuietHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='fake-upstream', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/'
+
+    def start(self) -> 'FakeUpstream':
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'FakeUpstream':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def install(self) -> None:
+        '''Point the application settings at this server, which has no rate limits, and close the breakers.'''
+        os.environ.setdefault('API_KEY', 'benchmark')
+        os.environ['IPINFO_URL'] = self.url + 'ipinfo/'
+        os.environ['OPENWEATHER_BASE_URL'] = self.url
+        get_settings.cache_clear()
+        RateLimiter.configure({})
+        CircuitBreaker.reset_all()
+
+    def route(self, path: str, query: dict) -> dict | list | bytes | None:
+        '''Return the payload served for path, json or file content, None for unknown paths.'''
+        if path.startswith('/ipinfo'):
+            return self.payloads['ipinfo']
+        if path == '/data/2.5/weather':
+            return self.payloads['weather']
+        if path == '/data/2.5/forecast':
+            return self.payloads['forecast']
+        if path == '/geo/1.0/direct':
+            name = query.get('q', [''])[0]
+            return [dict(self.payloads['geo'][0], name=name)] if name else []
+        if path.startswith('/img/wn/'):
+            filename = os.path.join(self.icons, os.path.basename(path))
+            if os.path.isfile(filename):
+                with open(filename, 'rb') as file:
+                    return file.read()
+        return None
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                upstream.requests += 1
+                delay = upstream.latency + upstream.random.uniform(0, upstream.jitter)
+                if upstream.random.random() < upstream.stall_rate:
+                    delay += upstream.stall
+                if delay:
+                    time.sleep(delay)
+
+                url = urlsplit(self.path)
+                payload = upstream.route(url.path, parse_qs(url.query))
+
+                if payload is None:
+                    status, body = 404, b'{"cod": "404"}'
+                elif upstream.random.random() < upstream.error_rate:
+                    status, body = 500, b'{"cod": "500"}'
+                elif isinstance(payload, bytes):
+                    status, body = 200, payload
+                else:
+                    status, body = 200, json.dumps(payload).encode()
+
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if status == 200 and upstream.etags and self.headers.get('If-None-Match') == etag:
+                    upstream.not_modified += 1
+                    status, body = 304, b''
+
+                self.send_response(status)
+                if status in (200, 304) and upstream.etags:
+                    self.send_header('ETag', etag)
+                self.send_header(
+                    'Content-Type',
+                    'image/png' if isinstance(payload, bytes) and status == 200 else 'application/json',
+                )
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,52 @@
+
+import timeit
+from benchmarks.legacy import legacy_process_forecast_data
+from benchmarks.payloads import synthetic_forecast
+from services.forecastAggregator import aggregate_forecast
+
+CASES = {
+    '5 days, 3 h': dict(entries=40, period=3 * 60 * 60),
+    '16 days, 1 h': dict(entries=16 * 24, period=60 * 60),
+    '1 year, 1 h': dict(entries=365 * 24, period=60 * 60),
+}
+
+
+def measure(function, repeat: int = 5) -> float:
+    '''Return best time, in sec, of one call of function.'''
+    number, _ = timeit.Timer(function).autorange()
+    return min(timeit.Timer(function).repeat(repeat=repeat, number=number)) / number
+
+
+def run() -> dict[str, dict[str, float]]:
+    '''Time legacy and streaming forecast processing on each case.'''
+    results = {}
+    for name, case in CASES.items():
+        data = synthetic_forecast(**case)
+        tz_offset = data['city']['timezone']
+
+        def legacy():
+            try:
+                legacy_process_forecast_data(data)
+            except IndexError:
+                pass  # partial days shorter than 12 // FORECAST_HOUR_PERIOD entries
+
+        def streaming():
+            aggregate_forecast(data['list'], tz_offset=tz_offset)
+
+        results[name] = {
+            'entries': len(data['list']),
+            'legacy': measure(legacy),
+            'streaming': measure(streaming),
+        }
+
+    return results
+
+
+if __name__ == '__main__':
+    for name, result in run().items():
+        print(
+            f'{name:<14} {result["entries"]:>6} entries  '
+            f'legacy {result["legacy"] * 1e6:>9.1f} us  '
+            f'streaming {result["streaming"] * 1e6:>9.1f} us  '
+            f'x{result["legacy"] / result["streaming"]:.1f}'
+        )
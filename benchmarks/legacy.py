@@ -0,0 +1,93 @@
+
+'''Data contracts and processing as they were before the performance work, for comparison.'''
+
+import calendar
+import datetime
+from dataclasses import dataclass
+from core.config import FORECAST_DAYS_SPAN, FORECAST_HOUR_PERIOD
+
+
+@dataclass
+class LegacyLocationData:
+    country: str
+    city: str
+    lat: float
+    lon: float
+
+
+@dataclass
+class LegacyWeatherDataCurrent:
+    icon: str | None
+    t: float
+    t_feels_like: float
+    description: str
+    dt: str
+
+
+@dataclass
+class LegacyWeatherDataForecast:
+    date: str
+    weekday: str
+    temp_min: float
+    temp_max: float
+    midday_icon: str | None
+    max_day_pop: float
+
+
+@dataclass
+class LegacyWeatherData:
+    flag: bool
+    current: LegacyWeatherDataCurrent
+    forecast: tuple[LegacyWeatherDataForecast]
+
+
+def legacy_process_current_weather_data(data) -> LegacyWeatherDataCurrent:
+    '''Current weather processing as it was before formatting moved to render time.'''
+    return LegacyWeatherDataCurrent(
+        icon=data['weather'][0]['icon'],
+        t=data['main']['temp'],
+        t_feels_like=data['main']['feels_like'],
+        description=data['weather'][0]['description'],
+        dt=datetime.datetime.fromtimestamp(
+            data['dt']).strftime('%H:%M %d/%m')
+    )
+
+
+def legacy_process_forecast_data(data) -> list[LegacyWeatherDataForecast]:
+    '''Forecast processing as it was before services.forecastAggregator.'''
+    weather_list = [
+        dict(
+            date=datetime.datetime.fromtimestamp(
+                dayInfo['dt']).strftime('%d/%m'),
+            weekday=calendar.day_name[datetime.datetime.fromtimestamp(
+                dayInfo['dt']).weekday()],
+            temp_min=dayInfo['main']['temp_min'],
+            temp_max=dayInfo['main']['temp_max'],
+            icon=dayInfo['weather'][0]['icon'],
+            pop=dayInfo['pop'],
+            datetime=dayInfo['dt_txt']
+        )
+        for dayInfo in data['list']
+    ]
+
+    grouped_data = []
+    for item in weather_list:
+        if len(grouped_data) == 0 or item['date'] != grouped_data[-1][0]['date']:
+            grouped_data.append([item])
+        else:
+            grouped_data[-1].append(item)
+
+    if len(grouped_data) == FORECAST_DAYS_SPAN + 1:
+        grouped_data = grouped_data[1:]
+
+    return [
+        LegacyWeatherDataForecast(
+            date=day[0]['date'],
+            weekday=day[0]['weekday'],
+            temp_min=min([float(item['temp_min']) for item in day]),
+            temp_max=max([float(item['temp_max']) for item in day]),
+            midday_icon=day[12 // FORECAST_HOUR_PERIOD]['icon'],
+            max_day_pop=max([float(item['pop']) for item in day])
+        )
+        for day in grouped_data[:-1]
+    ]
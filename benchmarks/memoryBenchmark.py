@@ -0,0 +1,72 @@
+
+import gc
+import tracemalloc
+from benchmarks.legacy import (LegacyLocationData, LegacyWeatherData,
+                               legacy_process_current_weather_data,
+                               legacy_process_forecast_data)
+from benchmarks.payloads import synthetic_forecast, synthetic_weather
+from contracts.contracts import LocationData, WeatherData
+from services.weatherService import WeatherService
+
+LOCATIONS = 1000
+
+
+def legacy_location(index: int, weather: dict, forecast: dict):
+    return (
+        LegacyLocationData(country='BR', city=f'City {index}', lat=float(index), lon=1.0),
+        LegacyWeatherData(
+            flag=True,
+            current=legacy_process_current_weather_data(weather),
+            forecast=tuple(legacy_process_forecast_data(forecast)),
+        ),
+    )
+
+
+def slotted_location(index: int, weather: dict, forecast: dict, service: WeatherService, series: bool = False):
+    return (
+        LocationData(country='BR', city=f'City {index}', lat=float(index), lon=1.0),
+        WeatherData(
+            flag=True,
+            current=service.process_current_weather_data(weather),
+            forecast=tuple(service.process_forecast_data(forecast)),
+            series=service.process_forecast_series(forecast) if series else None,
+        ),
+    )
+
+
+def measure(build) -> float:
+    '''Return bytes allocated and kept per location by build(index, weather, forecast).'''
+    payloads = [
+        (synthetic_weather(seed=index), synthetic_forecast(seed=index))
+        for index in range(LOCATIONS)
+    ]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    kept = [build(index, *payload) for index, payload in enumerate(payloads)]
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del kept
+    return size / LOCATIONS
+
+
+def run() -> dict[str, float]:
+    '''Measure memory per location of legacy and slotted contracts.'''
+    service = WeatherService.__new__(WeatherService)  # processing only, no transport
+    return {
+        'legacy': measure(legacy_location),
+        'slotted': measure(
+            lambda index, weather, forecast: slotted_location(index, weather, forecast, service)),
+        'slotted + series': measure(
+            lambda index, weather, forecast: slotted_location(index, weather, forecast, service, series=True)),
+    }
+
+
+if __name__ == '__main__':
+    for name, size in run().items():
+        print(f'{name:<18} {size:>8.0f} bytes per location')
@@ -0,0 +1,52 @@
+
+import random
+
+ICONS = ['01d', '02d', '03d', '04d', '09d', '10d', '11d', '13d', '50d']
+
+
+def synthetic_weather(dt: int = 1700000000, seed: int = 0) -> dict:
+    '''Return a current weather payload shaped like WEATHER_URL responses.'''
+    rng = random.Random(seed)
+    temp = round(rng.uniform(-10, 35), 2)
+    return {
+        'weather': [{'icon': rng.choice(ICONS), 'description': 'scattered clouds'}],
+        'main': {'temp': temp, 'feels_like': round(temp - 1.5, 2)},
+        'dt': dt,
+        'timezone': -10800,
+        'name': 'Synthetic',
+    }
+
+
+def synthetic_forecast(
+    entries: int = 40,
+    period: int = 3 * 60 * 60,
+    start: int = 1700000000,
+    tz_offset: int = -10800,
+    seed: int = 0,
+) -> dict:
+    '''Return a forecast payload shaped like FORECAST_URL responses.
+
+    entries steps of period seconds starting at start; hourly or 16-day feeds
+    are produced by changing period and entries.
+    '''
+    rng = random.Random(seed)
+    items = []
+    for step in range(entries):
+        temp = rng.uniform(-10, 35)
+        items.append({
+            'dt': start + step * period,
+            'main': {
+                'temp': round(temp, 2),
+                'temp_min': round(temp - rng.uniform(0, 2), 2),
+                'temp_max': round(temp + rng.uniform(0, 2), 2),
+            },
+            'weather': [{'icon': rng.choice(ICONS)}],
+            'pop': round(rng.random(), 2),
+            'dt_txt': '',
+        })
+
+    return {
+        'cnt': entries,
+        'list': items,
+        'city': {'name': 'Synthetic', 'timezone': tz_offset},
+    }
@@ -0,0 +1,287 @@
+import argparse
+import atexit
+import dataclasses
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fakeServer import FakeUpstream
+from benchmarks.payloads import synthetic_forecast, synthetic_weather
+from core.config import LOG_BACKUPS, METRICS_SAMPLES
+
+# python -m benchmarks.soakTest: refresh a window thousands of times against
+# the fake upstream and fail when memory, descriptors or Qt objects keep growing.
+
+# allowed growth from the end of the warm-up to the end of the run
+RSS_GROWTH = 8 * 1024 * 1024  # size, in bytes, of the process resident set
+TRACED_GROWTH = 1024 * 1024  # size, in bytes, of python allocations seen by tracemalloc
+FD_GROWTH = 2  # open file descriptors, a pooled connection may be replaced
+QT_GROWTH = 0  # widgets, children of the window and PyQt wrappers alive
+
+# the log rotates at this size in the run, so the run goes through rotations
+LOG_MAX_BYTES = 64 * 1024
+
+# until then histograms and timing buffers fill up to their bounds
+WARMUP = METRICS_SAMPLES + 200  # cycles
+
+PAYLOADS = 24  # distinct weather and forecast payloads served in turn
+MEDIAN_OF = 3  # samples at each end compared, against one-off spikes
+TOP_LINES = 10  # source lines reported with the largest allocation growth
+
+
+@dataclasses.dataclass(frozen=True)
+class Sample:
+    cycle: int
+    rss: int | None
+    traced: int
+    fds: int | None
+    widgets: int
+    qobjects: int
+    wrappers: int
+    log_bytes: int
+
+
+def rss() -> int | None:
+    '''Return resident set size of the process, in bytes, None where /proc is missing.'''
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def open_fds() -> int | None:
+    '''Return number of open file descriptors, None where /proc is missing.'''
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def log_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory) if name.startswith('app.log')
+    )
+
+
+def measure(cycle: int, application, window, log_dir: str) -> tuple[Sample, tracemalloc.Snapshot]:
+    '''Return a sample and a tracemalloc snapshot, without the memory of earlier snapshots.'''
+    from PyQt5 import QtCore, sip
+
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    sample = Sample(
+        cycle=cycle,
+        rss=rss(),
+        traced=sum(trace.size for trace in snapshot.traces),
+        fds=open_fds(),
+        widgets=len(application.allWidgets()),
+        qobjects=len(window.findChildren(QtCore.QObject)),
+        wrappers=sum(isinstance(item, sip.simplewrapper) for item in gc.get_objects()),
+        log_bytes=log_bytes(log_dir),
+    )
+    return sample, snapshot
+
+
+def growth(samples: list[Sample]) -> dict[str, float | None]:
+    '''Return per field growth between the median of the first and of the last samples.'''
+    head, tail = samples[:MEDIAN_OF], samples[-MEDIAN_OF:]
+    result = {}
+    for field in ('rss', 'traced', 'fds', 'widgets', 'qobjects', 'wrappers'):
+        if getattr(samples[0], field) is None:
+            result[field] = None
+            continue
+        result[field] = (
+            statistics.median(getattr(sample, field) for sample in tail)
+            - statistics.median(getattr(sample, field) for sample in head)
+        )
+    return result
+
+
+def check(grown: dict, samples: list[Sample], limits: dict, log_limit: int) -> list[str]:
+    '''Return descriptions of what grew past its limit.'''
+    failures = [
+        f'{field}: grew {grown[field]:.0f}, limit {limit}'
+        for field, limit in limits.items()
+        if grown[field] is not None and grown[field] > limit
+    ]
+    largest = max(sample.log_bytes for sample in samples)
+    if largest > log_limit:
+        failures.append(f'log_bytes: reached {largest}, limit {log_limit}')
+    return failures
+
+
+def top_growth(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> list[dict]:
+    '''Return the source lines whose allocations grew most between two snapshots.'''
+    stats = after.compare_to(before, 'lineno')
+    return [
+        {'line': str(stat.traceback), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+        for stat in stats[:TOP_LINES] if stat.size_diff > 0
+    ]
+
+
+def run(upstream: FakeUpstream, cycles: int, warmup: int, interval: int) -> tuple[list[Sample], list[dict], int]:
+    '''Refresh a shown window cycles times, sampling every interval cycles after warmup.
+
+    Return the samples, the lines that allocated most in between and the
+    number of failed refreshes.
+    '''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtCore, QtWidgets
+
+    application = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    QtCore.qInstallMessageHandler(lambda *args: None)  # the offscreen plugin warns on every show
+
+    import app
+    from core.logs import start_logging
+    from services.cacheService import WeatherCache
+    from services.historyService import HistoryStore
+    from services.locationService import LocationService
+
+    weathers = [synthetic_weather(seed=seed) for seed in range(PAYLOADS)]
+    forecasts = [synthetic_forecast(seed=seed) for seed in range(PAYLOADS)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        listener = start_logging(
+            stream_level=100, path=os.path.join(directory, 'app.log'), max_bytes=LOG_MAX_BYTES)
+
+        # as on a kiosk: location, snapshots and history on disk, but every refresh goes to the network
+        app.location_service = LocationService(path=os.path.join(directory, 'location.snapshot'))
+        app.weather_service.cache = WeatherCache(
+            ttl={'weather': 0, 'forecast': 0}, directory=os.path.join(directory, 'cache'))
+        app.weather_service.history = HistoryStore(path=os.path.join(directory, 'history.sqlite3'))
+
+        window = app.MainWindow(flags=QtCore.Qt.Window)
+        loop = QtCore.QEventLoop()
+        failed = []
+
+        def on_finished(job):
+            if job.future.exception() is not None:
+                failed.append(job)
+            loop.quit()
+
+        # after MainWindow.on_job_finished, connected first
+        window.jobSignals.finished.connect(on_finished, QtCore.Qt.QueuedConnection)
+        window.show()
+        loop.exec_()  # the ip location job
+
+        tracemalloc.start()
+        samples = []
+        snapshots = []
+        try:
+            for cycle in range(1, cycles + 1):
+                index = cycle % PAYLOADS
+                weather = dict(weathers[index], dt=weathers[index]['dt'] + cycle * 600)
+                upstream.payloads['weather'] = weather
+                upstream.payloads['forecast'] = forecasts[index]
+
+                window.updateWeatherTimer.stop()
+                window.refresh_weather()
+                loop.exec_()
+
+                if cycle >= warmup and (cycle - warmup) % interval == 0:
+                    sample, snapshot = measure(cycle, application, window, directory)
+                    samples.append(sample)
+                    snapshots[1:] = [snapshot]  # the first and the latest
+        finally:
+            tracemalloc.stop()
+            window.hide()
+            application.processEvents()
+            app.weather_service.history.close()
+
+            # the log directory goes away with the run
+            listener.stop()
+            atexit.unregister(listener.stop)
+            for handler in listener.handlers:
+                handler.close()
+
+    return samples, top_growth(snapshots[0], snapshots[-1]), len(failed)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.soakTest',
+        description='Refresh a window against a local fake upstream and fail on memory or handle growth.',
+    )
+    parser.add_argument('--cycles', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=WARMUP,
+                        help='cycles before the first sample, while caches, pools and histograms fill up')
+    parser.add_argument('--interval', type=int, default=100,
+                        help='cycles between samples')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='upstream latency, in sec')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of upstream calls answered with 500')
+    parser.add_argument('--rss-growth', type=int, default=RSS_GROWTH, metavar='BYTES')
+    parser.add_argument('--traced-growth', type=int, default=TRACED_GROWTH, metavar='BYTES')
+    parser.add_argument('--fd-growth', type=int, default=FD_GROWTH)
+    parser.add_argument('--qt-growth', type=int, default=QT_GROWTH)
+    parser.add_argument('--output', metavar='PATH',
+                        help='write samples as json to PATH instead of stdout')
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.cycles < args.warmup + MEDIAN_OF * args.interval * 2:
+        print(f'--cycles must leave {MEDIAN_OF * 2} samples after the warm-up', file=sys.stderr)
+        return 2
+
+    upstream = FakeUpstream(latency=args.latency, error_rate=args.error_rate, payloads='synthetic')
+    start = time.perf_counter()
+    with upstream:
+        upstream.install()
+        samples, lines, failed = run(upstream, args.cycles, args.warmup, args.interval)
+    elapsed = time.perf_counter() - start
+
+    grown = growth(samples)
+    failures = check(grown, samples, {
+        'rss': args.rss_growth,
+        'traced': args.traced_growth,
+        'fds': args.fd_growth,
+        'widgets': args.qt_growth,
+        'qobjects': args.qt_growth,
+        'wrappers': args.qt_growth,
+    }, log_limit=LOG_MAX_BYTES * (LOG_BACKUPS + 1))
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cycles': args.cycles,
+            'warmup': args.warmup,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'elapsed': elapsed,
+            'failed_refreshes': failed,
+            'upstream_requests': upstream.requests,
+        },
+        'growth': grown,
+        'failures': failures,
+        'top_growth': lines,
+        'samples': [dataclasses.asdict(sample) for sample in samples],
+    }
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for failure in failures:
+        print(f'growth: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
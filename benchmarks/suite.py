@@ -0,0 +1,579 @@
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections.abc import Callable
+from benchmarks.fakeServer import FakeUpstream
+from benchmarks.payloads import synthetic_forecast
+
+
+def summarize(name: str, samples: list[float], **extra) -> dict:
+    '''Return count, mean and percentiles, in sec, of samples.'''
+    percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'name': name,
+        'unit': 's',
+        'n': len(samples),
+        'mean': statistics.fmean(samples),
+        'min': min(samples),
+        'p50': percentiles[49],
+        'p95': percentiles[94],
+        'p99': percentiles[98],
+        **extra,
+    }
+
+
+def sample(function: Callable[[], object], repeat: int) -> list[float]:
+    '''Return wall time, in sec, of repeat calls of function after one warm-up call.'''
+    function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_forecast_throughput(repeat: int) -> list[dict]:
+    from services.forecastAggregator import aggregate_days, aggregate_forecast
+    from services.weatherService import WeatherService
+
+    service = WeatherService.__new__(WeatherService)  # processing only, no transport
+    results = []
+    for entries in (40, 16 * 24, 365 * 24):
+        data = synthetic_forecast(entries=entries, period=60 * 60)
+
+        # every day and entry: process_forecast_data stops after the displayed days
+        for name, function in (
+            ('aggregate_forecast', lambda: aggregate_forecast(data['list'], days=None)),
+            ('aggregate_days', lambda: list(aggregate_days(data['list']))),
+            ('process_forecast_series', lambda: service.process_forecast_series(data)),
+        ):
+            samples = sample(function, repeat)
+            results.append(summarize(
+                f'{name}[{entries}]', samples,
+                entries_per_sec=entries / statistics.median(samples),
+            ))
+    return results
+
+
+def bench_snapshot(repeat: int) -> list[dict]:
+    from benchmarks.fakeServer import load_fixture
+    from contracts import snapshot
+    from contracts.contracts import CacheEntry
+    from services.weatherService import WeatherService
+
+    service = WeatherService.__new__(WeatherService)  # processing only, no transport
+    results = []
+    for kind in ('weather', 'forecast'):
+        data = load_fixture(kind)
+        raw = json.dumps({'data': data})
+        encoded = snapshot.encode_entry(kind, CacheEntry(
+            fetched_at=0.0, expires_at=0.0, processed=service.process(kind, data)))
+
+        # what a fallback or startup read costs, before and after the binary snapshot
+        results.append(summarize(
+            f'json.loads+process[{kind}]',
+            sample(lambda: service.process(kind, json.loads(raw)['data']), repeat),
+            bytes=len(raw),
+        ))
+        results.append(summarize(
+            f'snapshot.decode_entry[{kind}]',
+            sample(lambda: snapshot.decode_entry(kind, encoded), repeat),
+            bytes=len(encoded),
+        ))
+    return results
+
+
+def bench_fetch_by_city(repeat: int) -> list[dict]:
+    from services.locationService import LocationService
+
+    service = LocationService()
+    return [
+        summarize(
+            'LocationService.fetch_by_city[index]',
+            sample(lambda: service.fetch_by_city('São Paulo'), repeat),
+        ),
+        # not in the bundled list, goes to the (fake) geocoder
+        summarize(
+            'LocationService.fetch_by_city[geocoder]',
+            sample(lambda: service.fetch_by_city('Springfield'), repeat),
+        ),
+        summarize(
+            'CityIndex.suggestions',
+            sample(lambda: service.city_index.suggestions('sa'), repeat),
+        ),
+    ]
+
+
+def bench_icons(repeat: int) -> list[dict]:
+    from services.iconService import IconSync, icon_files
+
+    syncs = max(3, repeat // 5)  # each one is a full round of icon requests
+    # with validators, so an unchanged sync is answered with 304s
+    with FakeUpstream(etags=True) as upstream, tempfile.TemporaryDirectory() as directory:
+        def icon_sync() -> IconSync:
+            return IconSync(
+                base_url=upstream.url + 'img/wn/',
+                directory=directory,
+                manifest=os.path.join(directory, 'manifest.json'),
+            )
+
+        def cold() -> None:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            icon_sync().sync()
+
+        results = [summarize('IconSync.sync[cold]', sample(cold, syncs), files=len(icon_files()))]
+        upstream.not_modified = 0
+        results.append(summarize(
+            'IconSync.sync[unchanged]', sample(lambda: icon_sync().sync(), syncs),
+            not_modified=upstream.not_modified))
+    return results
+
+
+def bench_rate_limit(calls: int = 60, rate: float = 200.0) -> list[dict]:
+    '''Wait for a token per lane while background calls keep a rate limiter saturated.'''
+    from concurrent.futures import ThreadPoolExecutor
+    from core.ratelimit import BACKGROUND, USER, RateLimiter, priority
+
+    limiter = RateLimiter('bench', calls=rate, period=1, burst=1)
+    waits = {USER: [], BACKGROUND: []}
+    depths = []
+
+    def call(lane: int) -> None:
+        with priority(lane):
+            depths.append(limiter.depth())
+            waits[lane].append(limiter.acquire())
+
+    with ThreadPoolExecutor(max_workers=calls + calls // 4) as executor:
+        for _ in range(calls):
+            executor.submit(call, BACKGROUND)
+        # user actions arrive behind a full background queue
+        for _ in range(calls // 4):
+            time.sleep(2 / rate)
+            executor.submit(call, USER)
+
+    return [
+        summarize(f'RateLimiter.wait[{name}]', waits[lane], rate=rate, max_queue=max(depths))
+        for lane, name in ((USER, 'user'), (BACKGROUND, 'background'))
+    ]
+
+
+def bench_stalls(repeat: int, upstream: FakeUpstream) -> list[dict]:
+    '''Tail latency of calls to upstreams that stall, with hedging, deadlines and the breaker.'''
+    from contracts.contracts import LocationData
+    from core.metrics import metrics
+    from services.cacheService import WeatherCache
+    from services.historyService import HistoryStore
+    from services.httpService import HttpService
+    from services.weatherService import WeatherService
+
+    http = HttpService()
+    results = []
+
+    # one call in ten stalls for half a second
+    with FakeUpstream(latency=0.01, stall_rate=0.1, stall=0.5) as flaky:
+        calls = [(flaky.url + 'data/2.5/weather',), (flaky.url + 'data/2.5/forecast',)]
+        for name, hedge_after in (('off', None), ('50ms', 0.05)):
+            samples = sample(lambda: http.get_all(*calls, hedge_after=hedge_after), repeat * 2)
+            results.append(summarize(f'HttpService.get_all[hedge {name}]', samples, stall_rate=0.1))
+
+    # every call stalls past the deadline: the first refreshes wait for it,
+    # then the open breaker serves the cached weather right away
+    service = WeatherService(
+        http=http,
+        cache=WeatherCache(ttl={'weather': 0, 'forecast': 0}, directory=None),
+        history=HistoryStore(path=None),
+        deadline=0.2,
+    )
+    location = LocationData(country='BR', city='São Paulo', lat=-23.55, lon=-46.64)
+    service.get(location)
+
+    with FakeUpstream(latency=1.0) as stalled:
+        stalled.install()
+        try:
+            samples = sample(lambda: service.get(location), repeat)
+            rejected = metrics.snapshot()['counters'].get('breaker.openweather.rejected', 0)
+        finally:
+            upstream.install()
+
+    results.append(summarize(
+        'WeatherService.get[stalled upstream]', samples,
+        deadline=service.deadline,
+        breaker_rejected=rejected,
+    ))
+    return results
+
+
+def bench_history(repeat: int, locations: int = 10, days: int = 60) -> list[dict]:
+    import tempfile
+    from contracts.contracts import LocationData, WeatherDataCurrent
+    from services.historyService import HistoryStore
+
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        places = [
+            LocationData(country='', city=str(index), lat=index, lon=-index)
+            for index in range(locations)
+        ]
+        rows = locations * days * 24 * 6
+        # a bulk load, room in the queue for every row
+        store = HistoryStore(os.path.join(directory, 'history.sqlite3'), queue_size=rows)
+
+        # one observation every 10 min
+        start = time.perf_counter()
+        for dt in range(now - days * 24 * 60 * 60, now, 10 * 60):
+            for place in places:
+                store.record_current(place, WeatherDataCurrent(
+                    icon='01d', t=20.0, t_feels_like=19.0, description='clear sky', dt=dt))
+        store.flush()
+        written = time.perf_counter() - start
+
+        since = now - 30 * 24 * 60 * 60
+        try:
+            return [summarize(
+                'HistoryStore.observations[30 days]',
+                sample(lambda: store.observations(places[0], since), repeat),
+                rows=rows,
+                rows_per_result=len(store.observations(places[0], since)),
+                writes_per_sec=rows / written,
+            )]
+        finally:
+            store.close()
+
+
+def bench_server(repeat: int, upstream: FakeUpstream, clients: int = 20) -> list[dict]:
+    from concurrent.futures import ThreadPoolExecutor
+    from contracts.contracts import LocationData
+    from services.cacheService import WeatherCache
+    from services.historyService import HistoryStore
+    from services.remoteService import RemoteWeatherService
+    from services.weatherService import WeatherService
+    from weather.server import WeatherServer
+
+    weather_server = WeatherServer(weather_service=WeatherService(
+        cache=WeatherCache(directory=None), history=HistoryStore(path=None)))
+    server = weather_server.listen(0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/'
+
+    locations = [
+        LocationData(country='', city=f'{lat},{lon}', lat=lat, lon=lon)
+        for lat, lon in ((51.5, -0.13), (35.69, 139.69), (-23.55, -46.64))
+    ]
+    services = [RemoteWeatherService(url) for _ in range(clients)]
+
+    # every client asks for every location at once, upstream sees each location once
+    before = upstream.requests
+    with ThreadPoolExecutor(max_workers=clients * len(locations)) as executor:
+        list(executor.map(
+            lambda call: call[0].get(call[1]),
+            [(service, location) for service in services for location in locations],
+        ))
+    fan_out = upstream.requests - before
+
+    try:
+        return [summarize(
+            'RemoteWeatherService.get[cached]',
+            sample(lambda: services[0].get(locations[0]), repeat),
+            clients=clients * len(locations),
+            upstream_requests=fan_out,
+        )]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_qt(repeat: int) -> list[dict]:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtGui, QtWidgets
+
+    application = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+    import app
+    from contracts.contracts import LocAndWeatherPayload
+    from services.cacheService import WeatherCache
+    from services.historyService import HistoryStore
+    from services.locationService import LocationService
+    from core.config import FORECAST_CHART_HEIGHT
+    from widgets.centralWidget import CentralWidget
+    from widgets.forecastChart import ForecastChart
+    from widgets.iconCache import IconCache
+
+    # every run goes to the (fake) network, fake data stays out of the history and the location file
+    app.weather_service.cache = WeatherCache(
+        ttl={'weather': 0, 'forecast': 0}, directory=None)
+    app.weather_service.history = HistoryStore(path=None)
+    app.location_service = LocationService(path=None)
+
+    location = app.location_service.fetch_current()
+    results = [summarize(
+        'load_weather',
+        sample(lambda: app.load_weather(location), repeat),
+    )]
+    results.append(summarize(
+        'frame_gap[refresh]',
+        frame_gaps(application, lambda: app.load_weather(location), repeat),
+    ))
+
+    weather = app.weather_service.get(location)
+    payloads = [
+        LocAndWeatherPayload(location_data=location, weather_data=weather),
+        LocAndWeatherPayload(
+            location_data=location,
+            weather_data=dataclasses.replace(
+                weather,
+                current=dataclasses.replace(weather.current, t=weather.current.t + 1),
+            ),
+        ),
+    ]
+
+    # every icon variant the widgets show, decoded by a new cache; QPixmap
+    # keeps pixmaps loaded from a file name in QPixmapCache, cleared to compare
+    def warm_up(icon_cache: IconCache) -> None:
+        QtGui.QPixmapCache.clear()
+        icon_cache.warm_up()
+
+    results.append(summarize(
+        'IconCache.warm_up[bundle]',
+        sample(lambda: warm_up(IconCache()), repeat),
+    ))
+    results.append(summarize(
+        'IconCache.warm_up[files]',
+        sample(lambda: warm_up(IconCache(bundle=None)), repeat),
+    ))
+
+    widget = CentralWidget()
+    widget.update(payloads[0])
+    application.processEvents()
+
+    results.append(summarize(
+        'CentralWidget.update[unchanged]',
+        sample(lambda: widget.update(payloads[0]), repeat),
+    ))
+
+    toggle = iter(range(sys.maxsize))
+    results.append(summarize(
+        'CentralWidget.update[changed]',
+        sample(lambda: widget.update(payloads[next(toggle) % 2]), repeat),
+    ))
+
+    # a shown chart paints synchronously on repaint(), and resizes right away
+    chart = ForecastChart()
+    chart.resize(560, FORECAST_CHART_HEIGHT)
+    chart.show()
+    application.processEvents()
+    series = [
+        weather.series,
+        dataclasses.replace(weather.series, temp=array('d', (temp + 1 for temp in weather.series.temp))),
+    ]
+    chart.update(series[0], True)
+
+    def refresh() -> None:
+        chart.update(series[next(toggle) % 2], True)
+        chart.repaint()
+
+    def resize() -> None:
+        chart.resize(560 - next(toggle) % 2 * 40, FORECAST_CHART_HEIGHT)
+        chart.repaint()
+
+    results.append(summarize('ForecastChart.paint[unchanged]', sample(chart.repaint, repeat)))
+    results.append(summarize('ForecastChart.paint[refresh]', sample(refresh, repeat)))
+    results.append(summarize('ForecastChart.paint[resize]', sample(resize, repeat)))
+    chart.hide()
+    return results
+
+
+def bench_startup(repeat: int, upstream: FakeUpstream, stall: float = 2.0) -> list[dict]:
+    '''Time a new window to its first paint with weather, from last run's snapshots while upstream stalls.'''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtCore, QtWidgets
+
+    application = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+    import app
+    from core.config import STARTUP_PAINT_BUDGET
+    from services.cacheService import WeatherCache
+    from services.historyService import HistoryStore
+    from services.locationService import LocationService
+
+    app.weather_service.history = HistoryStore(path=None)
+    latency = upstream.latency
+    windows = []
+    with tempfile.TemporaryDirectory() as directory:
+        # the previous run: a location found by ip and its weather on disk
+        app.location_service = LocationService(path=os.path.join(directory, 'location.snapshot'))
+        app.weather_service.cache = WeatherCache(directory=directory)
+        app.weather_service.get(app.location_service.fetch_current())
+
+        upstream.latency = stall
+        samples = []
+        try:
+            for _ in range(repeat + 1):
+                # a restart: nothing in memory
+                app.weather_service.cache = WeatherCache(directory=directory)
+                window = app.MainWindow(flags=QtCore.Qt.Window, started_at=time.perf_counter())
+                windows.append(window)
+                window.show()
+
+                deadline = time.perf_counter() + stall
+                while window.firstPaint is None:
+                    if time.perf_counter() > deadline:
+                        raise RuntimeError('No warm-start paint before the upstream answered')
+                    application.processEvents()
+                samples.append(window.firstPaint)
+        finally:
+            upstream.latency = latency
+
+        # the stalled refresh reports back to the windows and writes to directory, wait for it
+        while app.job_runner.pending('weather'):
+            application.processEvents()
+
+    for window in windows:
+        window.hide()
+    application.processEvents()
+
+    samples = samples[1:]  # the first window also pays for style and icon loading
+    return [summarize(
+        'first_paint[stalled upstream]', samples,
+        budget=STARTUP_PAINT_BUDGET,
+        over_budget=sum(elapsed > STARTUP_PAINT_BUDGET for elapsed in samples),
+    )]
+
+
+def frame_gaps(application, function: Callable[[], object], repeat: int) -> list[float]:
+    '''Return the longest GUI thread stall, in sec, seen by a 60 fps timer while function runs as a job.'''
+    from PyQt5 import QtCore
+    from app import JobSignals
+    from core.jobs import JobRunner
+
+    runner = JobRunner()
+    signals = JobSignals()
+    gaps = []
+    for _ in range(repeat):
+        loop = QtCore.QEventLoop()
+        ticks = [time.perf_counter()]
+
+        timer = QtCore.QTimer()
+        timer.setTimerType(QtCore.Qt.PreciseTimer)
+        timer.timeout.connect(lambda: ticks.append(time.perf_counter()))
+        timer.start(16)
+
+        # queued even when the job is already done at submit time
+        signals.finished.connect(loop.quit, QtCore.Qt.QueuedConnection)
+        runner.submit('bench', object(), function, callback=signals.finished.emit)
+        loop.exec_()
+        signals.finished.disconnect(loop.quit)
+        timer.stop()
+
+        ticks.append(time.perf_counter())
+        gaps.append(max(after - before for before, after in zip(ticks, ticks[1:])))
+    application.processEvents()
+    return gaps
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    '''Return descriptions of results whose p50 grew more than tolerance over baseline.'''
+    previous = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        if result['p50'] > before['p50'] * (1 + tolerance):
+            regressions.append(
+                f'{result["name"]}: p50 {before["p50"] * 1000:.3f} ms -> {result["p50"] * 1000:.3f} ms')
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Run the offline benchmark suite against a local fake upstream.',
+    )
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='upstream latency, in sec')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='extra random upstream latency, up to this many sec')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of upstream calls answered with 500')
+    parser.add_argument('--payloads', choices=['fixtures', 'synthetic'], default='fixtures')
+    parser.add_argument('--etags', action='store_true',
+                        help='let the upstream answer conditional requests with 304')
+    parser.add_argument('--no-qt', action='store_true',
+                        help='skip benchmarks that need PyQt5')
+    parser.add_argument('--output', metavar='PATH',
+                        help='write results as json to PATH instead of stdout')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='previous --output file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p50 growth over the baseline, as a fraction')
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    upstream = FakeUpstream(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        payloads=args.payloads,
+        etags=args.etags,
+    )
+    with upstream:
+        upstream.install()
+
+        results = bench_forecast_throughput(args.repeat)
+        results += bench_snapshot(args.repeat)
+        results += bench_fetch_by_city(args.repeat)
+        results += bench_server(args.repeat, upstream)
+        results += bench_icons(args.repeat)
+        results += bench_rate_limit()
+        results += bench_stalls(args.repeat, upstream)
+        results += bench_history(args.repeat)
+        if not args.no_qt:
+            results += bench_qt(args.repeat)
+            results += bench_startup(args.repeat, upstream)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'error_rate': args.error_rate,
+            'payloads': args.payloads,
+            'etags': args.etags,
+            'upstream_requests': upstream.requests,
+            'upstream_not_modified': upstream.not_modified,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file)['results'], args.tolerance)
+        for regression in regressions:
+            print(f'regression: {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
@@ -0,0 +1,114 @@
+import hashlib
+import mmap
+import struct
+from collections.abc import Mapping
+from core.exceptions import BundleError
+
+# A bundle is a header (magic, format version, file count), an index of
+# (name, offset, length, sha256) per file and the file contents back to
+# back. Offsets count from the start of the bundle, so a file is one slice
+# of the memory-mapped bundle.
+MAGIC = b'WXIB'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHI')  # magic, version, count
+ENTRY = struct.Struct('<QI32s')  # offset, length, sha256
+LENGTH = struct.Struct('<H')
+
+
+def pack(files: Mapping[str, bytes]) -> bytes:
+    '''Return a bundle of files, content by name.'''
+    names = sorted(files)
+    index = bytearray(HEADER.pack(MAGIC, VERSION, len(names)))
+    for name in names:
+        encoded = name.encode()
+        index += LENGTH.pack(len(encoded))
+        index += encoded
+        index += bytes(ENTRY.size)  # filled in below, once offsets are known
+
+    offset = len(index)
+    position = HEADER.size
+    for name in names:
+        content = files[name]
+        position += LENGTH.size + len(name.encode())
+        ENTRY.pack_into(index, position, offset, len(content), hashlib.sha256(content).digest())
+        position += ENTRY.size
+        offset += len(content)
+
+    return bytes(index) + b''.join(files[name] for name in names)
+
+
+class IconBundle:
+    '''Read-only, memory-mapped bundle written by pack.'''
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._index = self._read_index()
+        except BundleError:
+            self._map.close()
+            raise
+
+    def _read_index(self) -> dict[str, tuple[int, int, bytes]]:
+        try:
+            magic, version, count = HEADER.unpack_from(self._map, 0)
+        except struct.error as error:
+            raise BundleError('Bundle is truncated') from error
+
+        if magic != MAGIC:
+            raise BundleError('Not an icon bundle')
+        if version != VERSION:
+            raise BundleError(f'Bundle version {version}, expected {VERSION}')
+
+        index = {}
+        position = HEADER.size
+        try:
+            for _ in range(count):
+                length, = LENGTH.unpack_from(self._map, position)
+                position += LENGTH.size
+                name = str(self._map[position:position + length], 'utf-8')
+                position += length
+
+                offset, size, digest = ENTRY.unpack_from(self._map, position)
+                position += ENTRY.size
+                if offset + size > len(self._map):
+                    raise BundleError(f'Bundle is truncated at {name}')
+                index[name] = (offset, size, digest)
+        except (struct.error, UnicodeDecodeError) as error:
+            raise BundleError('Bundle index is corrupt') from error
+
+        return index
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def names(self) -> list[str]:
+        return list(self._index)
+
+    def get(self, name: str) -> bytes | None:
+        '''Return content of file name, None when the bundle does not hold it.'''
+        entry = self._index.get(name)
+        if entry is None:
+            return None
+        offset, size, _ = entry
+        return self._map[offset:offset + size]
+
+    def digest(self, name: str) -> bytes | None:
+        '''Return sha256 of file name as recorded when packed.'''
+        entry = self._index.get(name)
+        return None if entry is None else entry[2]
+
+    def verify(self) -> list[str]:
+        '''Return names of files whose content no longer matches their sha256.'''
+        return [
+            name for name, (offset, size, digest) in self._index.items()
+            if hashlib.sha256(self._map[offset:offset + size]).digest() != digest
+        ]
+
+    def close(self) -> None:
+        self._map.close()
@@ -1,7 +1,22 @@
+import calendar
+import datetime
+from array import array
+from collections.abc import Iterable
 from dataclasses import dataclass
 
 
-@dataclass
+def local_datetime(dt: int, tz_offset: int) -> datetime.datetime:
+    '''Return unix time dt as a naive datetime in a zone tz_offset sec from UTC.'''
+    return datetime.datetime.fromtimestamp(dt + tz_offset, datetime.UTC).replace(tzinfo=None)
+
+
+def check_coordinates(lat: float, lon: float) -> None:
+    '''Raise ValueError unless lat and lon are degrees within +-90 and +-180, NaN and infinities are not.'''
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f'coordinates out of range: {lat},{lon}')
+
+
+@dataclass(frozen=True, slots=True)
 class LocationData:
     country: str
     city: str
@@ -9,36 +24,141 @@ class LocationData:
     lon: float
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class WeatherDataCurrent:
     icon: str | None
     t: float
     t_feels_like: float
     description: str
-    dt: str
+    dt: int  # unix time, in sec
+    tz_offset: int = 0  # shift from UTC, in sec
 
     def __str__(self) -> str:
         return f'{self.icon}, {self.t}, C'
 
+    @property
+    def local_time(self) -> str:
+        return local_datetime(self.dt, self.tz_offset).strftime('%H:%M %d/%m')
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class WeatherDataForecast:
-    date: str
-    weekday: str
+    dt: int  # unix time of local midnight, in sec
     temp_min: float
     temp_max: float
     midday_icon: str | None
     max_day_pop: float
+    tz_offset: int = 0  # shift from UTC, in sec
 
+    @property
+    def date(self) -> str:
+        return local_datetime(self.dt, self.tz_offset).strftime('%d/%m')
 
-@dataclass
+    @property
+    def weekday(self) -> str:
+        return calendar.day_name[local_datetime(self.dt, self.tz_offset).weekday()]
+
+
+@dataclass(frozen=True, slots=True)
+class ForecastSeries:
+    '''Per-step forecast as typed columns, one array per field.'''
+    dt: array  # 'q', unix time, in sec
+    temp: array  # 'd', celsius
+    pop: array  # 'd', probability, 0 to 1
+    tz_offset: int = 0  # shift from UTC, in sec
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], tz_offset: int = 0) -> 'ForecastSeries':
+        dt, temp, pop = array('q'), array('d'), array('d')
+        for entry in entries:
+            dt.append(entry['dt'])
+            temp.append(entry['main']['temp'])
+            pop.append(entry.get('pop', 0.0))
+
+        return cls(dt=dt, temp=temp, pop=pop, tz_offset=tz_offset)
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+
+@dataclass(frozen=True, slots=True)
+class ObservationSeries:
+    '''Past observations of a location as typed columns, one array per field.'''
+    dt: array  # 'q', unix time, in sec
+    temp: array  # 'd', celsius
+    feels_like: array  # 'd', celsius
+    tz_offset: int = 0  # shift from UTC, in sec
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+
+@dataclass(frozen=True, slots=True)
 class WeatherData:
     flag: bool
-    current: WeatherDataCurrent
+    current: WeatherDataCurrent | None
     forecast: tuple[WeatherDataForecast]
+    error: str | None = None
+    series: ForecastSeries | None = None
 
+    @classmethod
+    def from_dict(cls, data: dict) -> 'WeatherData':
+        '''Rebuild from dataclasses.asdict output, e.g. decoded from json.'''
+        current, series = data['current'], data['series']
+        return cls(
+            flag=data['flag'],
+            current=None if current is None else WeatherDataCurrent(**current),
+            forecast=tuple(WeatherDataForecast(**day) for day in data['forecast']),
+            error=data['error'],
+            series=None if series is None else ForecastSeries(
+                dt=array('q', series['dt']),
+                temp=array('d', series['temp']),
+                pop=array('d', series['pop']),
+                tz_offset=series['tz_offset'],
+            ),
+        )
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class LocAndWeatherPayload:
     location_data: LocationData
     weather_data: WeatherData
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LocAndWeatherPayload':
+        '''Rebuild from dataclasses.asdict output, e.g. decoded from json.'''
+        return cls(
+            location_data=LocationData(**data['location_data']),
+            weather_data=WeatherData.from_dict(data['weather_data']),
+        )
+
+
+@dataclass
+class RequestTiming:
+    url: str
+    status: int | None
+    elapsed: float  # time, in sec
+
+    def __str__(self) -> str:
+        return f'GET {self.url} {self.status} {self.elapsed * 1000:.0f} ms'
+
+
+@dataclass
+class CacheEntry:
+    fetched_at: float  # unix time, in sec
+    expires_at: float  # unix time, in sec, before which upstream has nothing newer
+    etag: str | None = None
+    last_modified: str | None = None
+    processed: object = None  # data already processed, stored as a binary snapshot
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def validators(self) -> dict[str, str]:
+        '''Return headers making a conditional request for newer data.'''
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
@@ -0,0 +1,199 @@
+import os
+import struct
+import threading
+from array import array
+from contracts.contracts import (CacheEntry, ForecastSeries, LocationData,
+                                 WeatherDataCurrent, WeatherDataForecast)
+from core.exceptions import SnapshotError
+
+# A snapshot is a header (magic, format version, record type) and one
+# record of little-endian struct fields. Strings are a u16 byte length
+# (0xFFFF for None) and utf-8 bytes. Forecast series are array columns in
+# native byte order, loaded with one frombytes each.
+MAGIC = b'WXSN'
+VERSION = 1
+
+LOCATION = 0
+WEATHER = 1
+FORECAST = 2
+KINDS = {'weather': WEATHER, 'forecast': FORECAST}
+
+HEADER = struct.Struct('<4sHB')  # magic, version, record type
+COORDS = struct.Struct('<dd')  # lat, lon
+ENTRY = struct.Struct('<dd')  # fetched_at, expires_at
+CURRENT = struct.Struct('<ddqi')  # t, t_feels_like, dt, tz_offset
+DAY = struct.Struct('<qdddi')  # dt, temp_min, temp_max, max_day_pop, tz_offset
+COUNT = struct.Struct('<I')
+SERIES = struct.Struct('<Ii')  # steps, tz_offset
+LENGTH = struct.Struct('<H')
+NONE = 0xFFFF
+
+
+class Writer:
+    def __init__(self, record: int):
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION, record))
+
+    def pack(self, layout: struct.Struct, *values) -> None:
+        self.buffer += layout.pack(*values)
+
+    def text(self, value: str | None) -> None:
+        if value is None:
+            self.buffer += LENGTH.pack(NONE)
+            return
+        encoded = value.encode()
+        self.buffer += LENGTH.pack(len(encoded))
+        self.buffer += encoded
+
+    def column(self, values: array) -> None:
+        self.buffer += values.tobytes()
+
+
+class Reader:
+    def __init__(self, buffer: bytes, record: int):
+        self.view = memoryview(buffer)
+        self.offset = 0
+        try:
+            magic, version, found = self.unpack(HEADER)
+        except struct.error as error:
+            raise SnapshotError('Snapshot is truncated') from error
+
+        if magic != MAGIC:
+            raise SnapshotError('Not a snapshot')
+        if version != VERSION:
+            raise SnapshotError(f'Snapshot version {version}, expected {VERSION}')
+        if found != record:
+            raise SnapshotError(f'Snapshot holds record type {found}, expected {record}')
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        values = layout.unpack_from(self.view, self.offset)
+        self.offset += layout.size
+        return values
+
+    def text(self) -> str | None:
+        length, = self.unpack(LENGTH)
+        if length == NONE:
+            return None
+        value = str(self.view[self.offset:self.offset + length], 'utf-8')
+        self.offset += length
+        return value
+
+    def column(self, typecode: str, length: int) -> array:
+        values = array(typecode)
+        end = self.offset + length * values.itemsize
+        if end > len(self.view):
+            raise SnapshotError('Snapshot is truncated')
+        values.frombytes(self.view[self.offset:end])
+        self.offset = end
+        return values
+
+
+def encode_location(location: LocationData) -> bytes:
+    writer = Writer(LOCATION)
+    writer.pack(COORDS, location.lat, location.lon)
+    writer.text(location.country)
+    writer.text(location.city)
+    return bytes(writer.buffer)
+
+
+def decode_location(buffer: bytes) -> LocationData:
+    reader = Reader(buffer, LOCATION)
+    try:
+        lat, lon = reader.unpack(COORDS)
+        return LocationData(country=reader.text(), city=reader.text(), lat=lat, lon=lon)
+    except (struct.error, UnicodeDecodeError) as error:
+        raise SnapshotError('Snapshot is corrupt') from error
+
+
+def encode_entry(kind: str, entry: CacheEntry) -> bytes:
+    '''Encode metadata and processed payload of a weather or forecast cache entry.'''
+    writer = Writer(KINDS[kind])
+    writer.pack(ENTRY, entry.fetched_at, entry.expires_at)
+    writer.text(entry.etag)
+    writer.text(entry.last_modified)
+
+    if kind == 'weather':
+        current: WeatherDataCurrent = entry.processed
+        writer.pack(CURRENT, current.t, current.t_feels_like, current.dt, current.tz_offset)
+        writer.text(current.icon)
+        writer.text(current.description)
+        return bytes(writer.buffer)
+
+    forecast, series = entry.processed
+    writer.pack(COUNT, len(forecast))
+    for day in forecast:
+        writer.pack(DAY, day.dt, day.temp_min, day.temp_max, day.max_day_pop, day.tz_offset)
+        writer.text(day.midday_icon)
+
+    writer.pack(SERIES, len(series), series.tz_offset)
+    writer.column(series.dt)
+    writer.column(series.temp)
+    writer.column(series.pop)
+    return bytes(writer.buffer)
+
+
+def decode_entry(kind: str, buffer: bytes) -> CacheEntry:
+    '''Decode a cache entry written by encode_entry, without its raw payload.'''
+    reader = Reader(buffer, KINDS[kind])
+    try:
+        fetched_at, expires_at = reader.unpack(ENTRY)
+        etag, last_modified = reader.text(), reader.text()
+
+        if kind == 'weather':
+            t, t_feels_like, dt, tz_offset = reader.unpack(CURRENT)
+            processed = WeatherDataCurrent(
+                icon=reader.text(),
+                t=t,
+                t_feels_like=t_feels_like,
+                description=reader.text(),
+                dt=dt,
+                tz_offset=tz_offset,
+            )
+        else:
+            forecast = []
+            for _ in range(reader.unpack(COUNT)[0]):
+                dt, temp_min, temp_max, max_day_pop, tz_offset = reader.unpack(DAY)
+                forecast.append(WeatherDataForecast(
+                    dt=dt,
+                    temp_min=temp_min,
+                    temp_max=temp_max,
+                    midday_icon=reader.text(),
+                    max_day_pop=max_day_pop,
+                    tz_offset=tz_offset,
+                ))
+
+            steps, tz_offset = reader.unpack(SERIES)
+            series = ForecastSeries(
+                dt=reader.column('q', steps),
+                temp=reader.column('d', steps),
+                pop=reader.column('d', steps),
+                tz_offset=tz_offset,
+            )
+            processed = (tuple(forecast), series)
+    except (struct.error, UnicodeDecodeError) as error:
+        raise SnapshotError('Snapshot is corrupt') from error
+
+    return CacheEntry(
+        fetched_at=fetched_at,
+        expires_at=expires_at,
+        etag=etag,
+        last_modified=last_modified,
+        processed=processed,
+    )
+
+
+def read(path: str) -> bytes | None:
+    '''Return content of snapshot file path, None when it does not exist.'''
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write(path: str, snapshot: bytes) -> None:
+    '''Atomically replace path with snapshot.'''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(snapshot)
+    os.replace(temporary, path)
@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+from .config import BREAKER_FAILURES, BREAKER_RESET
+from .metrics import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    '''Stop calling an upstream after repeated failures, for every caller of the process.
+
+    After failures consecutive failed calls the breaker opens and calls are
+    refused right away. reset sec later one trial call goes through: its
+    success closes the breaker, its failure opens it for another reset sec.
+    '''
+
+    _shared: dict[str, 'CircuitBreaker'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset: float = BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset = reset
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, name: str) -> 'CircuitBreaker':
+        '''Return the process-wide breaker of upstream name.'''
+        with cls._shared_lock:
+            breaker = cls._shared.get(name)
+            if breaker is None:
+                breaker = cls._shared[name] = cls(name)
+            return breaker
+
+    @classmethod
+    def reset_all(cls) -> None:
+        '''Forget every breaker, e.g. when the upstreams are pointed elsewhere.'''
+        with cls._shared_lock:
+            cls._shared = {}
+
+    def allow(self) -> bool:
+        '''Whether a call may go to the upstream now. A True while half-open makes it the trial call.'''
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset:
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+
+        metrics.increment(f'breaker.{self.name}.rejected')
+        return False
+
+    def cancel(self) -> None:
+        '''Give back an allowed call that was never made, so a half-open breaker lets another trial through.'''
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool) -> None:
+        '''Record the outcome of an allowed call.'''
+        with self._lock:
+            previous = self.state
+            if ok:
+                self.state = CLOSED
+                self.consecutive = 0
+            else:
+                self.consecutive += 1
+                if self.state == HALF_OPEN or self.consecutive >= self.failures:
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+            self._trial = False
+            state = self.state
+
+        if state != previous:
+            metrics.increment(f'breaker.{self.name}.{state}')
+            logger = logging.getLogger('app')
+            logger.warning(f'Breaker: {self.name} {previous} -> {state}')
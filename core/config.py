@@ -1,73 +1,179 @@
 
+import functools
 import logging
-import logging.config
 import os
+from dataclasses import dataclass
+from .exceptions import ConfigurationError
 from .utils import resource
 
 DEBUG = True
 
-# --------        LOGGING        --------
-logging.config.dictConfig({
-    'version': 1,
-    'disable_existing_loggers': False,
-
-    'formatters': {
-        'stream_formatter': {
-            'format': '[%(asctime)s: %(levelname)s] %(message)s',
-        },
-        'file_formatter': {
-            'format': '[%(asctime)s: %(levelname)s] %(message)s',
-        },
-    },
-
-    'handlers': {
-        'stream_handler': {
-            'class': 'logging.StreamHandler',
-            'level': logging.DEBUG,
-            'formatter': 'stream_formatter',
-        },
-        'file_handler': {
-            'class': 'logging.FileHandler',
-            'level': logging.INFO,
-            'filename': os.path.join('.', 'app.log'),
-            'mode': 'a',
-            'formatter': 'file_formatter',
-        },
-    },
-
-    'loggers': {
-        'app': {
-            'level': logging.DEBUG,
-            'handlers': ['stream_handler', 'file_handler'],
-            'propagate': True,
-        },
-    },
-
-}
-)
-
-# --------        ENV        --------
-filepath = '.env'
-with open(resource(filepath), mode='r') as file:
-    for line in file.readlines():
-        key, value = line.split('=')
-
-        os.environ[key] = value
-
-API_KEY = os.environ['API_KEY']
-
 # --------        APP        --------
 APPLICATION_NAME = 'Weather App'
 APPLICATION_VERSION = '1.0.0'
 IPINFO_URL = 'https://ipinfo.io/'
 OPENWEATHER_BASE_URL = 'https://api.openweathermap.org/'
-WEATHER_URL = OPENWEATHER_BASE_URL + 'data/2.5/weather'
-FORECAST_URL = OPENWEATHER_BASE_URL + 'data/2.5/forecast'
-GEOLOCAL_URL = OPENWEATHER_BASE_URL + 'geo/1.0/direct'
+ENV_FILE = '.env'
+LOG_FILE = os.path.join('.', 'app.log')
+
+
+# --------        SETTINGS        --------
+@dataclass(frozen=True)
+class Settings:
+    api_key: str
+    ipinfo_url: str = IPINFO_URL
+    openweather_base_url: str = OPENWEATHER_BASE_URL
+    metrics_port: int | None = None
+    metrics_dump_interval: float | None = None  # time, in sec
+    weather_server_url: str | None = None  # python -m weather --serve endpoint used instead of the internet
+
+    @property
+    def weather_url(self) -> str:
+        return self.openweather_base_url + 'data/2.5/weather'
+
+    @property
+    def forecast_url(self) -> str:
+        return self.openweather_base_url + 'data/2.5/forecast'
+
+    @property
+    def geolocal_url(self) -> str:
+        return self.openweather_base_url + 'geo/1.0/direct'
+
+
+def load_env(filepath: str = ENV_FILE) -> None:
+    '''Copy KEY=value lines of filepath into os.environ, keeping values already set.'''
+    if not os.path.exists(resource(filepath)):
+        return
+
+    with open(resource(filepath), mode='r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+
+            key, value = line.split('=', 1)
+            os.environ.setdefault(key.strip(), value.strip())
+
+
+@functools.cache
+def get_settings() -> Settings:
+    '''Load .env on first call and return the application settings.'''
+    load_env()
+
+    weather_server_url = os.environ.get('WEATHER_SERVER_URL') or None
+    if 'API_KEY' not in os.environ and weather_server_url is None:
+        raise ConfigurationError(
+            f'API_KEY is not set, add it (or WEATHER_SERVER_URL) to {ENV_FILE}')
+
+    return Settings(
+        api_key=os.environ.get('API_KEY', ''),
+        ipinfo_url=os.environ.get('IPINFO_URL', IPINFO_URL),
+        openweather_base_url=os.environ.get(
+            'OPENWEATHER_BASE_URL', OPENWEATHER_BASE_URL),
+        metrics_port=_optional(int, os.environ.get('METRICS_PORT')),
+        metrics_dump_interval=_optional(
+            float, os.environ.get('METRICS_DUMP_INTERVAL')),
+        weather_server_url=weather_server_url,
+    )
+
+
+def _optional(cast, value: str | None):
+    return None if value in (None, '') else cast(value)
+
+
+# --------        LOGGING        --------
+LOG_MAX_BYTES = 1024 * 1024  # size, in bytes, at which app.log is rotated
+LOG_BACKUPS = 3  # rotated files kept, app.log.1 being the newest
+LOG_QUEUE_SIZE = 10000  # records waiting for the writer thread, newer ones are dropped
+LOG_BURST_WINDOW = 5 * 60  # time, in sec, without an error that ends its burst
+
+
+def configure_logging(stream_level: int = logging.DEBUG) -> None:
+    '''Set up the app logger. Called once by entry points, never on import.'''
+    from .logs import start_logging
+    start_logging(stream_level)
+
 
 # --------        WEATHER        --------
-WEATHER_UPDATE_INTERVAL = 10 * 60 * 1000  # time, in msec
+WEATHER_UPDATE_INTERVAL = 10 * 60 * 1000  # time, in msec, longest wait between refreshes
+REFRESH_MIN_DELAY = 30  # time, in sec, shortest wait between refreshes
+REFRESH_MAX_BACKOFF = 30 * 60  # time, in sec, longest wait after repeated failures
+REFRESH_HIDDEN_INTERVAL = 30 * 60  # time, in sec, shortest wait while the window is hidden
+REFRESH_JITTER = 0.5  # fraction of a backoff delay randomly cut off
 FORECAST_DAYS_SPAN = 5
 FORECAST_HOUR_PERIOD = 3
+FORECAST_CHART_HEIGHT = 110  # size, in px, of the hourly temperature and precipitation chart
 EXCLUDE = ','.join(['minutely', 'hourly', 'alerts'])
 UNITS = 'metric'
+BATCH_MAX_WORKERS = 5  # locations fetched concurrently by WeatherService.get_many
+JOB_WORKERS = 4  # user actions and refreshes run concurrently off the GUI thread
+REFRESH_DEADLINE = 12  # time, in sec, upstream calls of a refresh may take before it falls back to the cache
+
+# --------        STARTUP        --------
+STARTUP_PAINT_BUDGET = 0.5  # time, in sec, from launch to the first paint showing weather
+
+# --------        HTTP        --------
+HTTP_POOL_SIZE = 10
+HTTP_TIMINGS_KEPT = 100
+HTTP_TIMEOUT = (3.05, 10)  # time, in sec, to connect and between bytes of an answer
+HTTP_HEDGE_AFTER = 2.0  # time, in sec, before a slow concurrent call is sent once more, None disables it
+
+# --------        CIRCUIT BREAKER        --------
+BREAKER_FAILURES = 3  # consecutive failed calls that open the breaker of an upstream
+BREAKER_RESET = 30  # time, in sec, an open breaker refuses calls before letting a trial one through
+
+# --------        RATE LIMITS        --------
+RATE_LIMITS = {  # upstream: (calls, per time in sec), shared by every call of the process
+    'openweather': (60, 60),  # free plan
+    'ipinfo': (1500, 24 * 60 * 60),  # free plan, 50k a month
+}
+RATE_LIMIT_RETRIES = 3  # times a background call waits out a 429 answer before returning it
+
+# --------        CACHE        --------
+CACHE_DIR = os.path.join('.', '.cache')  # None disables the disk tier
+LOCATION_FILE = os.path.join('.', '.location.snapshot')  # last location found by ip
+CACHE_MAX_SIZE = 128  # entries kept in memory
+CACHE_COORD_PRECISION = 2  # decimal places, ~1 km
+WEATHER_CACHE_TTL = 10 * 60  # time, in sec, upper bound of freshness
+FORECAST_CACHE_TTL = 3 * 60 * 60  # time, in sec, upper bound of freshness
+CACHE_MIN_RECHECK = 60  # time, in sec, lower bound of freshness
+WEATHER_OBSERVATION_CADENCE = 10 * 60  # time, in sec, between upstream observations
+FORECAST_ISSUE_CADENCE = 3 * 60 * 60  # time, in sec, between upstream forecast runs
+
+# --------        HISTORY        --------
+HISTORY_FILE = os.path.join('.', 'history.sqlite3')  # None disables the history store
+HISTORY_BATCH = 256  # queued writes committed in one transaction
+HISTORY_QUEUE = 4096  # writes waiting for the writer, more are dropped
+
+# --------        SERVER        --------
+SERVER_BIND = '127.0.0.1'  # address python -m weather --serve listens on
+SERVER_LOCATION_TTL = 60 * 60  # time, in sec, the server's own ip location is reused
+SERVER_MAX_LOCATIONS = 1024  # weather responses kept encoded in memory
+
+# --------        CITIES        --------
+CITY_LIST_FILE = os.path.join('.', 'data', 'cities.tsv')  # bundled, most populous first
+CITY_INDEX_FILE = os.path.join('.', '.cache', 'cities.tsv.gz')  # written by python -m weather --import-cities
+CITY_SUGGESTIONS = 10  # autocomplete entries shown while typing
+CITY_SCAN_LIMIT = 500  # prefix matches ranked per keystroke
+
+# --------        ICONS        --------
+ICON_IDS = [
+    f'{icon_id}{time_of_day}'
+    for icon_id in ['01', '02', '03', '04', '09', '10', '11', '13', '50']
+    for time_of_day in ['d', 'n']
+]
+ICON_SCALES = ['', '@2x', '@4x']  # file variants of each icon
+ICON_BASE_URL = 'https://openweathermap.org/img/wn/'
+ICON_DIR = os.path.join('.', 'icons')
+ICON_MANIFEST_FILE = os.path.join('.', 'icons', 'manifest.json')  # content hash and validators per icon file
+ICON_BUNDLE_FILE = os.path.join('.', 'icons', 'icons.bundle')  # written by python -m icons.parser
+ICON_SYNC_WORKERS = 8  # icons downloaded concurrently
+ICON_SYNC_RETRIES = 3  # attempts per icon after the first
+ICON_SYNC_BACKOFF = 0.5  # time, in sec, before the first retry, doubled for each next one
+ICON_WARM_UP = True  # decode every icon when the window opens
+CURRENT_ICON_SCALE = '@4x'
+CURRENT_ICON_SIZE = 512  # size, in px
+FORECAST_ICON_SCALE = ''
+
+# --------        METRICS        --------
+METRICS_SAMPLES = 1024  # latest observations kept per histogram
@@ -1,8 +1,3 @@
-
-import sys
-import traceback
-
-
 class WeatherServerError(Exception):
     '''Weather server error.'''
 
@@ -11,6 +6,19 @@ class LocationServerError(Exception):
     '''LocationService server error.'''
 
 
+class ConfigurationError(Exception):
+    '''Missing or invalid application settings.'''
+
+
+class SnapshotError(Exception):
+    '''Unreadable, corrupt or outdated binary snapshot.'''
+
+
+class BundleError(Exception):
+    '''Unreadable, corrupt or outdated icon bundle.'''
+
+
 def eprint(error: Exception) -> None:
-    '''print exception traceback.'''
-    traceback.print_exception(error, limit=2, file=sys.stdout)
+    '''Log exception traceback, once per burst of the same error.'''
+    from .logs import error_bursts  # reads the config, which imports this module
+    error_bursts.log(error)
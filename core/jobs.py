@@ -0,0 +1,124 @@
+import contextvars
+import itertools
+import threading
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from .config import JOB_WORKERS
+from .metrics import metrics
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+    lane: str
+    generation: int
+    key: Hashable
+    future: Future = field(compare=False, repr=False)
+
+
+class JobRunner:
+    '''Run user actions on a worker pool, off the GUI thread.
+
+    Every submitted job gets a new generation and supersedes the previous
+    job of its lane: that job is cancelled if it has not started yet, and
+    its result should be dropped otherwise (see is_current). Jobs with the
+    same key share one call while it is in flight. Calls run in a copy of
+    the submitter's context, e.g. its rate limit priority.
+    '''
+
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.RLock()  # done callbacks may run inside submit
+        self._generations = itertools.count(1)
+        self._latest: dict[str, Job] = {}
+        self._inflight: dict[Hashable, tuple[Future, set[int]]] = {}
+
+    def submit(self, lane: str, key: Hashable, function: Callable, *args,
+               callback: Callable[[Job], None] | None = None) -> Job:
+        '''Run function(*args) as the newest job of lane, calling callback(job) once it is done.'''
+        with self._lock:
+            previous = self._latest.get(lane)
+            if previous is not None:
+                self._release(previous)
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future = self.executor.submit(contextvars.copy_context().run, function, *args)
+                inflight = self._inflight[key] = (future, set())
+                future.add_done_callback(
+                    lambda future, key=key: self._forget(key, future))
+            else:
+                metrics.increment('jobs.coalesced')
+
+            job = Job(lane=lane, generation=next(self._generations),
+                      key=key, future=inflight[0])
+            inflight[1].add(job.generation)
+            self._latest[lane] = job
+
+        if callback is not None:
+            job.future.add_done_callback(lambda _: callback(job))
+        return job
+
+    def is_current(self, job: Job) -> bool:
+        '''Whether job is still the newest of its lane, i.e. its result should be applied.'''
+        with self._lock:
+            return self._latest.get(job.lane) is job
+
+    def pending(self, lane: str) -> bool:
+        '''Whether the newest job of lane is still running or queued.'''
+        with self._lock:
+            job = self._latest.get(lane)
+            return job is not None and not job.future.done()
+
+    def _release(self, job: Job) -> None:
+        '''Cancel the call of a superseded job unless another job waits for it.'''
+        inflight = self._inflight.get(job.key)
+        if inflight is None or inflight[0] is not job.future:
+            return
+
+        inflight[1].discard(job.generation)
+        if not inflight[1] and job.future.cancel():
+            metrics.increment('jobs.cancelled')
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] is future:
+                del self._inflight[key]
+
+
+class SingleFlight:
+    '''Run one call per key at a time, concurrent callers of a key share its outcome.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, function: Callable, *args):
+        '''Return function(*args), or the result of the identical call already in flight.'''
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.increment('single_flight.shared')
+            return future.result()
+
+        try:
+            result = function(*args)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
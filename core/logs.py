@@ -0,0 +1,151 @@
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import traceback
+from .config import LOG_BACKUPS, LOG_BURST_WINDOW, LOG_FILE, LOG_MAX_BYTES, LOG_QUEUE_SIZE
+from .metrics import metrics
+from .utils import resource
+
+# extra= fields of the refresh path, kept as their own keys in app.log
+FIELDS = ('location', 'stage', 'duration', 'status')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    '''Hand records to the listener thread, dropping them when its queue is full.'''
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment('log.dropped')
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatted here, arguments and tracebacks may not outlive the call
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info, limit=2)).rstrip()
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    '''[time: LEVEL] message key=value ..., the fields of FIELDS a record has.'''
+
+    def __init__(self):
+        super().__init__('[%(asctime)s: %(levelname)s] %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = ' '.join(
+            f'{name}={format_field(getattr(record, name))}'
+            for name in FIELDS if hasattr(record, name)
+        )
+        if not fields:
+            return text
+        head, newline, tail = text.partition('\n')  # fields before a traceback
+        return f'{head} {fields}{newline}{tail}'
+
+
+class JsonFormatter(logging.Formatter):
+    '''One json object per record: time, level, message, FIELDS a record has and its traceback.'''
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for name in FIELDS:
+            if hasattr(record, name):
+                entry[name] = getattr(record, name)
+        if record.exc_text:
+            entry['traceback'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def format_field(value) -> str:
+    if isinstance(value, float):
+        return f'{value:.3f}'
+    text = str(value)
+    return json.dumps(text, ensure_ascii=False) if ' ' in text or not text else text
+
+
+def start_logging(
+    stream_level: int = logging.DEBUG,
+    path: str = LOG_FILE,
+    max_bytes: int = LOG_MAX_BYTES,
+    backups: int = LOG_BACKUPS,
+) -> logging.handlers.QueueListener:
+    '''Route the app logger through a queue to a stream and a rotating json file written by one thread.'''
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(stream_level)
+    stream_handler.setFormatter(TextFormatter())
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        resource(path), maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(JsonFormatter())
+
+    records: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(
+        records, stream_handler, file_handler, respect_handler_level=True)
+
+    logger = logging.getLogger('app')
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(DroppingQueueHandler(records))
+
+    listener.start()
+    atexit.register(listener.stop)  # flushes what is queued
+    return listener
+
+
+class ErrorBursts:
+    '''Log a traceback per burst of the same error, later ones of the burst as one debug line.
+
+    Errors are the same when they have the same type and were raised from
+    the same line. A burst ends after window sec without that error.
+    '''
+
+    def __init__(self, window: float = LOG_BURST_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._bursts: dict[tuple, list] = {}  # key: [last seen, repeats since the last traceback]
+
+    def log(self, error: BaseException) -> None:
+        frames = traceback.extract_tb(error.__traceback__)
+        origin = (frames[-1].filename, frames[-1].lineno) if frames else None
+        key = (type(error), origin)
+        now = time.monotonic()
+
+        with self._lock:
+            burst = self._bursts.get(key)
+            new = burst is None or now - burst[0] > self.window
+            repeats = 0 if burst is None else burst[1]
+            if new:
+                self._bursts[key] = [now, 0]
+            else:
+                burst[0] = now
+                burst[1] += 1
+
+        logger = logging.getLogger('app')
+        if not new:
+            metrics.increment('log.suppressed')
+            logger.debug(f'{type(error).__name__}: {error} (traceback logged earlier in this burst)')
+            return
+
+        suffix = f' ({repeats} more in the previous burst)' if repeats else ''
+        logger.error(f'{type(error).__name__}: {error}{suffix}', exc_info=error)
+
+
+error_bursts = ErrorBursts()
@@ -0,0 +1,139 @@
+
+import functools
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import METRICS_SAMPLES
+
+
+class Histogram:
+    '''Latency distribution over the last METRICS_SAMPLES observations.'''
+
+    def __init__(self, size: int = METRICS_SAMPLES):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self) -> dict:
+        '''Return count, total and p50/p95/p99 of recent samples, in sec.'''
+        samples = list(self.samples)
+        summary = {'count': self.count, 'total': self.total}
+        if len(samples) >= 2:
+            percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+            summary.update(p50=percentiles[49], p95=percentiles[94], p99=percentiles[98])
+        elif samples:
+            summary.update(p50=samples[0], p95=samples[0], p99=samples[0])
+        return summary
+
+
+class Metrics:
+    '''Process-wide counters and latency histograms of the refresh pipeline.'''
+
+    def __init__(self):
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str):
+        '''Time the wrapped block into histogram name.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        '''Decorate a function to time each call into histogram name.'''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {
+                    name: histogram.summary()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+metrics = Metrics()
+
+
+def serve_metrics(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    '''Serve metrics.snapshot() as json on http://host:port/metrics from a daemon thread.'''
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+
+            body = json.dumps(metrics.snapshot()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name='metrics', daemon=True).start()
+
+    logger = logging.getLogger('app')
+    logger.info(f'Metrics: serving on http://{host}:{server.server_address[1]}/metrics')
+    return server
+
+
+def dump_metrics(interval: float) -> threading.Thread:
+    '''Log metrics.snapshot() every interval sec from a daemon thread.'''
+
+    def run():
+        logger = logging.getLogger('app')
+        while True:
+            time.sleep(interval)
+            logger.info(f'Metrics: {json.dumps(metrics.snapshot())}')
+
+    thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_metrics(port: int | None, interval: float | None) -> None:
+    '''Start whichever metrics surfaces are configured.'''
+    if port is not None:
+        serve_metrics(port)
+    if interval is not None:
+        dump_metrics(interval)
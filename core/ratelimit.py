@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .config import RATE_LIMITS
+from .metrics import metrics
+
+# priority lanes, lower goes first
+USER = 0
+BACKGROUND = 1
+LANES = {USER: 'user', BACKGROUND: 'background'}
+
+# lane of the calls made by the current task; thread pools of the app copy
+# the submitter's context, so a job's http calls keep the lane of its job
+call_priority = ContextVar('call_priority', default=USER)
+
+
+@contextmanager
+def priority(value: int):
+    '''Run the wrapped block, and the jobs it submits, in lane value.'''
+    token = call_priority.set(value)
+    try:
+        yield
+    finally:
+        call_priority.reset(token)
+
+
+class RateLimiter:
+    '''Token bucket shared by every call of the process to one upstream.
+
+    Tokens refill at calls / period per sec, up to burst. A call that finds
+    no token queues instead of failing, and the queue is served by lane,
+    then arrival, so user actions overtake queued background refreshes.
+    '''
+
+    _shared: dict[str, 'RateLimiter'] = {}
+    _shared_lock = threading.Lock()
+    _limits = RATE_LIMITS
+
+    def __init__(self, name: str, calls: int, period: float, burst: int | None = None):
+        self.name = name
+        self.rate = calls / period
+        self.capacity = float(burst or calls)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._condition = threading.Condition()
+        self._waiting: list[tuple[int, int]] = []  # heap of (lane, ticket)
+        self._tickets = itertools.count()
+
+    @classmethod
+    def shared(cls, name: str) -> 'RateLimiter | None':
+        '''Return the process-wide limiter of upstream name, None when it has no limit.'''
+        with cls._shared_lock:
+            limiter = cls._shared.get(name)
+            if limiter is None and name in cls._limits:
+                limiter = cls._shared[name] = cls(name, *cls._limits[name])
+            return limiter
+
+    @classmethod
+    def configure(cls, limits: dict[str, tuple]) -> None:
+        '''Replace RATE_LIMITS, e.g. to lift them for a local fake upstream.'''
+        with cls._shared_lock:
+            cls._limits = limits
+            cls._shared = {}
+
+    def acquire(self, timeout: float | None = None) -> float | None:
+        '''Take a token for a call in the current lane, waiting for it if needed. Return the wait, in sec.
+
+        Return None, and leave the queue, when no token came within timeout sec.
+        '''
+        current = call_priority.get()
+        start = time.monotonic()
+        give_up_at = None if timeout is None else start + timeout
+        queued = False
+        with self._condition:
+            ticket = (current, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            metrics.observe(f'ratelimit.{self.name}.queue', len(self._waiting) - 1)
+
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if give_up_at is not None and now >= give_up_at:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                    metrics.increment(f'ratelimit.{self.name}.expired')
+                    return None
+
+                if self._waiting[0] != ticket:
+                    queued = True
+                    self._condition.wait(None if give_up_at is None else give_up_at - now)  # woken when the head changes
+                    continue
+                if self.tokens >= 1 and now >= self.paused_until:
+                    break
+                queued = True
+                delay = max((1 - self.tokens) / self.rate, self.paused_until - now)
+                self._condition.wait(delay if give_up_at is None else min(delay, give_up_at - now))
+
+            heapq.heappop(self._waiting)
+            self.tokens -= 1
+            self._condition.notify_all()
+
+        waited = time.monotonic() - start
+        metrics.observe(f'ratelimit.{self.name}.wait[{LANES[current]}]', waited)
+        if queued:
+            metrics.increment(f'ratelimit.{self.name}.queued')
+        return waited
+
+    def pause(self, delay: float) -> None:
+        '''Hand out no token for delay sec, e.g. after the upstream answered 429.'''
+        with self._condition:
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self._condition.notify_all()
+        metrics.increment(f'ratelimit.{self.name}.paused')
+
+    def depth(self) -> int:
+        '''Return how many calls are waiting for a token.'''
+        with self._condition:
+            return len(self._waiting)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
@@ -0,0 +1,62 @@
+
+import random
+from collections.abc import Callable
+from .config import (REFRESH_HIDDEN_INTERVAL, REFRESH_JITTER, REFRESH_MAX_BACKOFF,
+                     REFRESH_MIN_DELAY, WEATHER_UPDATE_INTERVAL)
+
+
+class RefreshScheduler:
+    '''Decide when the next weather refresh is worth running.
+
+    A healthy refresh waits until the cached data expires, bounded by
+    min_delay and interval. Failures back off exponentially with jitter up
+    to max_backoff. While hidden, refreshes wait at least hidden_interval.
+    All times are in sec.
+    '''
+
+    def __init__(
+        self,
+        interval: float = WEATHER_UPDATE_INTERVAL / 1000,
+        min_delay: float = REFRESH_MIN_DELAY,
+        max_backoff: float = REFRESH_MAX_BACKOFF,
+        hidden_interval: float = REFRESH_HIDDEN_INTERVAL,
+        jitter: float = REFRESH_JITTER,
+        random: Callable[[], float] = random.random,
+    ):
+        self.interval = interval
+        self.min_delay = min(min_delay, interval)
+        self.max_backoff = max_backoff
+        self.hidden_interval = hidden_interval
+        self.jitter = jitter
+        self.random = random
+        self.failures = 0
+        self.visible = True
+
+    def record(self, ok: bool) -> None:
+        '''Record the outcome of the last refresh.'''
+        self.failures = 0 if ok else self.failures + 1
+
+    def reset(self) -> None:
+        '''Forget past failures, e.g. when the network comes back.'''
+        self.failures = 0
+
+    def set_visible(self, visible: bool) -> None:
+        self.visible = visible
+
+    def next_delay(self, now: float, expires_at: float | None = None) -> float:
+        '''Return sec to wait before the next refresh.
+
+        expires_at is the unix time at which cached data may be outdated, if known.
+        '''
+        if self.failures:
+            backoff = min(self.max_backoff, self.min_delay * 2 ** (self.failures - 1))
+            delay = backoff * (1 - self.jitter * self.random())
+        elif expires_at is not None:
+            delay = min(max(expires_at - now, self.min_delay), self.interval)
+        else:
+            delay = self.interval
+
+        if not self.visible:
+            delay = max(delay, self.hidden_interval)
+
+        return delay
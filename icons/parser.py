@@ -1,17 +1,41 @@
+import argparse
+import sys
+from core.config import ICON_BASE_URL, ICON_BUNDLE_FILE, ICON_SYNC_WORKERS, configure_logging
+from services.iconService import FAILED, IconSync
 
-import os
+# python -m icons.parser: download changed icons from OpenWeather and
+# rebuild the bundle the widgets load them from.
 
-import requests
 
-from .utils import resource
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m icons.parser',
+        description='Download changed weather icons and pack them into one bundle.',
+    )
+    parser.add_argument('--base-url', default=ICON_BASE_URL,
+                        help='where icon files are served (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=ICON_SYNC_WORKERS,
+                        help='icons downloaded concurrently')
+    parser.add_argument('--output', default=ICON_BUNDLE_FILE, metavar='PATH',
+                        help='bundle to write (default: %(default)s)')
+    parser.add_argument('--pack-only', action='store_true',
+                        help='rebuild the bundle from the icon files on disk, without downloading')
+    args = parser.parse_args(argv)
 
+    configure_logging()
+    icon_sync = IconSync(base_url=args.base_url, workers=args.workers)
 
-for icon_id in ['01', '02', '03', '04', '09', '10', '11', '13', '50']:
-    for time_of_day in ['d', 'n']:
-        for scale in ['', '@2x', '@4x']:
-            url = f'https://openweathermap.org/img/wn/{icon_id}{time_of_day}{scale}.png'
-            response = requests.get(url)
+    failed = []
+    if not args.pack_only:
+        results = icon_sync.sync()
+        failed = [name for name, status in results.items() if status == FAILED]
+        for name in failed:
+            print(f'failed: {name}', file=sys.stderr)
 
-            filename = os.path.join('.', 'icons', f'{icon_id}{time_of_day}{scale}.png')
-            with open(resource(filename), 'wb') as file:
-                file.write(response.content)
+    # files that failed keep their previous version in the bundle
+    print(f'packed {icon_sync.pack(args.output)} icons into {args.output}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contracts import snapshot
+from contracts.contracts import CacheEntry, LocationData
+from core.config import (CACHE_COORD_PRECISION, CACHE_DIR, CACHE_MAX_SIZE,
+                         CACHE_MIN_RECHECK, FORECAST_CACHE_TTL, FORECAST_ISSUE_CADENCE,
+                         WEATHER_CACHE_TTL, WEATHER_OBSERVATION_CADENCE)
+from core.exceptions import eprint, SnapshotError
+from core.metrics import metrics
+from core.utils import resource
+
+
+class WeatherCache:
+    '''Per-location LRU cache of api payloads with an optional disk tier of processed snapshots.'''
+
+    def __init__(
+        self,
+        max_size: int = CACHE_MAX_SIZE,
+        ttl: dict[str, float] | None = None,
+        directory: str | None = CACHE_DIR,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl or {
+            'weather': WEATHER_CACHE_TTL,
+            'forecast': FORECAST_CACHE_TTL,
+        }
+        self.directory = directory
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(location: LocationData) -> tuple[float, float]:
+        '''Quantize location coordinates so nearby lookups share an entry.'''
+        return (
+            round(float(location.lat), CACHE_COORD_PRECISION),
+            round(float(location.lon), CACHE_COORD_PRECISION),
+        )
+
+    def get_entry(self, location: LocationData, kind: str) -> CacheEntry | None:
+        '''Return cached kind entry of location regardless of its age, None when missing.'''
+        key = (*self.key(location), kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self._store(key, entry)
+
+        return entry
+
+    def get(self, location: LocationData, kind: str, fresh: bool = True) -> object | None:
+        '''Return processed kind payload of location, None when missing or expired.
+
+        With fresh=False any cached payload is returned regardless of its age.
+        '''
+        entry = self.get_entry(location, kind)
+        if entry is None or (fresh and not entry.is_fresh(time.time())):
+            return None
+
+        return entry.processed
+
+    def put(
+        self,
+        location: LocationData,
+        kind: str,
+        processed: object,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> CacheEntry:
+        '''Cache kind payload of location, processed.'''
+        key = (*self.key(location), kind)
+        now = time.time()
+        with self._lock:
+            previous = self._entries.get(key)
+        entry = CacheEntry(
+            fetched_at=now,
+            expires_at=self.expires_at(kind, processed, now, previous),
+            etag=etag,
+            last_modified=last_modified,
+            processed=processed,
+        )
+        self._store(key, entry)
+        self._dump(key, entry)
+        return entry
+
+    def revalidate(self, location: LocationData, kind: str, entry: CacheEntry) -> CacheEntry:
+        '''Mark entry as confirmed unchanged by upstream, keeping its processed data.'''
+        key = (*self.key(location), kind)
+        now = time.time()
+        entry.expires_at = self.expires_at(kind, entry.processed, now, entry)
+        entry.fetched_at = now
+        self._store(key, entry)
+        self._dump(key, entry)
+        return entry
+
+    def expires_at(self, kind: str, processed: object, now: float, previous: CacheEntry | None = None) -> float:
+        '''Return when upstream may have newer kind data than processed, fetched at now.
+
+        Observations are replaced WEATHER_OBSERVATION_CADENCE after their dt,
+        forecasts are issued every FORECAST_ISSUE_CADENCE. Data no newer than
+        the previous entry doubles the previous recheck, upstream is running
+        late. Newer data already due for replacement was published late, the
+        next is due a cadence from now. The result is kept between
+        CACHE_MIN_RECHECK and the kind TTL from now.
+        '''
+        if kind == 'weather':
+            cadence = WEATHER_OBSERVATION_CADENCE
+            upstream = processed.dt + cadence
+        else:
+            cadence = FORECAST_ISSUE_CADENCE
+            upstream = now - now % cadence + cadence
+
+        if previous is not None:
+            if not self.newer(kind, processed, previous.processed):
+                upstream = max(upstream, now + 2 * (previous.expires_at - previous.fetched_at))
+            elif upstream <= now:
+                upstream = now + cadence  # published late, the next one a cadence after this one showed up
+
+        return min(max(upstream, now + CACHE_MIN_RECHECK), now + self.ttl[kind])
+
+    @staticmethod
+    def newer(kind: str, processed: object, previous: object) -> bool:
+        '''Return whether processed kind data is newer than previous.'''
+        if kind == 'weather':
+            return processed.dt > previous.dt
+        return processed != previous  # a forecast run has no issue time of its own
+
+    def _store(self, key: tuple, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _filename(self, key: tuple) -> str:
+        lat, lon, kind = key
+        return resource(os.path.join(self.directory, f'{lat}_{lon}.{kind}.snapshot'))
+
+    def _load(self, key: tuple) -> CacheEntry | None:
+        if self.directory is None:
+            return None
+
+        try:
+            with metrics.span('cache.read'):
+                content = snapshot.read(self._filename(key))
+                if content is None:
+                    return None
+                return snapshot.decode_entry(key[2], content)
+        except (OSError, SnapshotError) as error:
+            eprint(error)
+            return None
+
+    def _dump(self, key: tuple, entry: CacheEntry) -> None:
+        if self.directory is None:
+            return
+
+        try:
+            # written aside and renamed, a crash mid-write leaves the previous snapshot
+            with metrics.span('cache.write'):
+                snapshot.write(self._filename(key), snapshot.encode_entry(key[2], entry))
+        except OSError as error:
+            eprint(error)
+            return
+
+        logger = logging.getLogger('app')
+        logger.debug(f'Cache: stored {key}')
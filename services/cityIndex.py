@@ -0,0 +1,228 @@
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from typing import IO
+from contracts.contracts import LocationData
+from core.config import CITY_INDEX_FILE, CITY_LIST_FILE, CITY_SCAN_LIMIT, CITY_SUGGESTIONS
+from core.metrics import metrics
+from core.utils import resource
+
+Row = tuple[str, str, float, float]  # name, country, lat, lon
+
+
+def normalize(name: str) -> str:
+    '''Return name casefolded, without accents and with single spaces, as used for lookups.'''
+    decomposed = unicodedata.normalize('NFKD', name.casefold())
+    return ' '.join(
+        ''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def split_query(query: str) -> tuple[str, str]:
+    '''Split "city, CC" into the normalized city and the uppercase country prefix.'''
+    city, _, country = query.partition(',')
+    return normalize(city), country.strip().upper()
+
+
+class CityIndex:
+    '''Sorted-array prefix index of city names, looked up without the network.'''
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, keys: list[str], ranks: array, names: list[str], countries: list[str], lat: array, lon: array):
+        self.keys = keys
+        self.ranks = ranks  # position in the source list, lower is more populous
+        self.names = names
+        self.countries = countries
+        self.lat = lat
+        self.lon = lon
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def shared(cls) -> 'CityIndex':
+        '''Return the process-wide index, from the imported city list if there is one.'''
+        with cls._shared_lock:
+            if cls._shared is None:
+                path = CITY_INDEX_FILE if os.path.exists(resource(CITY_INDEX_FILE)) else CITY_LIST_FILE
+                with metrics.span('city_index.load'):
+                    cls._shared = cls.load(path)
+
+                logger = logging.getLogger('app')
+                logger.debug(f'City index: {len(cls._shared)} cities from {path}')
+            return cls._shared
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Row]) -> 'CityIndex':
+        '''Build index from unsorted rows, most populous first.'''
+        decorated = sorted(
+            (normalize(name), rank, name, country, lat, lon)
+            for rank, (name, country, lat, lon) in enumerate(rows)
+        )
+        return cls(
+            keys=[row[0] for row in decorated],
+            ranks=array('I', (row[1] for row in decorated)),
+            names=[row[2] for row in decorated],
+            countries=[row[3] for row in decorated],
+            lat=array('d', (row[4] for row in decorated)),
+            lon=array('d', (row[5] for row in decorated)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'CityIndex':
+        '''Load index from a city list (.tsv) or from an index written by dump (.tsv.gz).'''
+        if not path.endswith('.gz'):
+            with open(resource(path), 'r', encoding='utf-8') as file:
+                return cls.from_rows(read_rows(file))
+
+        # already sorted, with the lookup key as first column
+        with gzip.open(resource(path), 'rt', encoding='utf-8') as file:
+            fields = file.read().replace('\n', '\t').split('\t')[:-1]
+        return cls(
+            keys=fields[0::6],
+            ranks=array('I', map(int, fields[1::6])),
+            names=fields[2::6],
+            countries=fields[3::6],
+            lat=array('d', map(float, fields[4::6])),
+            lon=array('d', map(float, fields[5::6])),
+        )
+
+    def dump(self, path: str) -> None:
+        '''Atomically write index to path in the format read by load.'''
+        path = resource(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temporary = f'{path}.tmp'
+        with gzip.open(temporary, 'wt', encoding='utf-8') as file:
+            for row in zip(self.keys, self.ranks, self.names, self.countries, self.lat, self.lon):
+                file.write('\t'.join(map(str, row)) + '\n')
+        os.replace(temporary, path)
+
+    def location(self, position: int) -> LocationData:
+        return LocationData(
+            country=self.countries[position],
+            city=self.names[position],
+            lat=self.lat[position],
+            lon=self.lon[position],
+        )
+
+    def positions(self, query: str) -> Iterator[int]:
+        '''Yield positions of cities starting with the query, alphabetically then by rank.'''
+        key, country = split_query(query)
+        if not key:
+            return
+
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position].startswith(key):
+            if self.countries[position].startswith(country):
+                yield position
+            position += 1
+
+    def search(self, query: str, limit: int = CITY_SUGGESTIONS) -> list[LocationData]:
+        '''Return up to limit most populous cities whose name starts with query, optionally "city, CC".'''
+        # short prefixes match thousands of cities, rank only the first ones
+        candidates = itertools.islice(self.positions(query), CITY_SCAN_LIMIT)
+        best = heapq.nsmallest(limit, candidates, key=self.ranks.__getitem__)
+        return [self.location(position) for position in best]
+
+    def suggestions(self, query: str, limit: int = CITY_SUGGESTIONS) -> list[str]:
+        '''Return "city, CC" labels of search results, without duplicates.'''
+        labels = dict.fromkeys(
+            f'{location.city}, {location.country}' for location in self.search(query, limit))
+        return list(labels)
+
+    def resolve(self, query: str) -> LocationData | None:
+        '''Return the most populous city named exactly query, or None.'''
+        key, _ = split_query(query)
+        for position in self.positions(query):
+            if self.keys[position] != key:
+                break
+            return self.location(position)
+        return None
+
+
+def read_rows(file: IO[str]) -> Iterator[Row]:
+    '''Yield rows of a tab separated city list, skipping blank lines.'''
+    for line in file:
+        line = line.rstrip('\n')
+        if not line:
+            continue
+
+        name, country, lat, lon = line.split('\t')
+        yield name, country, float(lat), float(lon)
+
+
+def iter_json_array(file: IO[str], chunk_size: int = 1 << 16) -> Iterator[object]:
+    '''Yield items of a top level json array one by one, reading file in chunks.'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+
+    while True:
+        chunk = file.read(chunk_size)
+        buffer += chunk
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError('City list is not a json array')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # item continues in the next chunk
+            yield item
+
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise ValueError('City list ends in the middle of an item')
+            return
+
+
+def import_city_list(source: str, destination: str = CITY_INDEX_FILE) -> int:
+    '''Merge OpenWeather's bulk city.list.json(.gz) with the bundled list into the index at destination.
+
+    Returns the number of cities written.
+    '''
+    with open(resource(CITY_LIST_FILE), 'r', encoding='utf-8') as file:
+        rows = list(read_rows(file))
+    seen = {(normalize(name), country, round(lat, 1), round(lon, 1))
+            for name, country, lat, lon in rows}
+
+    opener = gzip.open if source.endswith('.gz') else open
+    with opener(source, 'rt', encoding='utf-8') as file:
+        for city in iter_json_array(file):
+            name, country = city['name'].strip(), city.get('country', '')
+            lat, lon = city['coord']['lat'], city['coord']['lon']
+
+            # the bulk file repeats cities under several ids
+            key = (normalize(name), country, round(lat, 1), round(lon, 1))
+            if not name or key in seen:
+                continue
+            seen.add(key)
+            rows.append((name, country, lat, lon))
+
+    index = CityIndex.from_rows(rows)
+    index.dump(destination)
+
+    with CityIndex._shared_lock:
+        CityIndex._shared = None
+    return len(index)
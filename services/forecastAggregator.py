@@ -0,0 +1,102 @@
+
+from collections.abc import Iterable, Iterator
+from contracts.contracts import WeatherDataForecast
+
+DAY = 24 * 60 * 60  # time, in sec
+MIDDAY = DAY // 2  # time, in sec
+
+
+class DayAccumulator:
+    '''Running min/max/pop and midday icon of one location-local day.'''
+
+    __slots__ = ('day', 'tz_offset', 'temp_min', 'temp_max', 'max_pop',
+                 'midday_icon', 'midday_distance', 'last_second')
+
+    def __init__(self, day: int, tz_offset: int = 0):
+        self.day = day
+        self.tz_offset = tz_offset
+        self.temp_min = float('inf')
+        self.temp_max = float('-inf')
+        self.max_pop = 0.0
+        self.midday_icon = None
+        self.midday_distance = DAY
+        self.last_second = -1
+
+    def add(self, second: int, temp_min: float, temp_max: float, pop: float, icon: str | None) -> None:
+        if temp_min < self.temp_min:
+            self.temp_min = temp_min
+        if temp_max > self.temp_max:
+            self.temp_max = temp_max
+        if pop > self.max_pop:
+            self.max_pop = pop
+
+        distance = abs(second - MIDDAY)
+        if distance < self.midday_distance:
+            self.midday_distance = distance
+            self.midday_icon = icon
+
+        self.last_second = second
+
+    def reaches_midday(self) -> bool:
+        '''Whether the day is covered at least up to midday.'''
+        return self.last_second >= MIDDAY
+
+    def to_forecast(self) -> WeatherDataForecast:
+        return WeatherDataForecast(
+            dt=self.day * DAY - self.tz_offset,
+            temp_min=self.temp_min,
+            temp_max=self.temp_max,
+            midday_icon=self.midday_icon,
+            max_day_pop=self.max_pop,
+            tz_offset=self.tz_offset,
+        )
+
+
+def aggregate_days(entries: Iterable[dict], tz_offset: int = 0) -> Iterator[DayAccumulator]:
+    '''Fold api forecast entries, ordered by dt, into one accumulator per local day.
+
+    tz_offset is the location shift from UTC in seconds (forecast city.timezone).
+    Days are yielded as soon as the next one starts, so entries are never buffered.
+    '''
+    current = None
+    for entry in entries:
+        local = entry['dt'] + tz_offset
+        day, second = divmod(local, DAY)
+
+        if current is None or day != current.day:
+            if current is not None:
+                yield current
+            current = DayAccumulator(day, tz_offset)
+
+        main = entry['main']
+        weather = entry.get('weather')
+        current.add(
+            second,
+            float(main['temp_min']),
+            float(main['temp_max']),
+            float(entry.get('pop', 0.0)),
+            weather[0]['icon'] if weather else None,
+        )
+
+    if current is not None:
+        yield current
+
+
+def aggregate_forecast(entries: Iterable[dict], tz_offset: int = 0, days: int | None = None) -> list[WeatherDataForecast]:
+    '''Return daily forecasts after today, in location-local time, in one pass.
+
+    The first day is today, which the current weather already covers, and is skipped.
+    Trailing days whose entries end before midday are dropped as incomplete.
+    '''
+    forecast = []
+    accumulators = aggregate_days(entries, tz_offset)
+    next(accumulators, None)
+
+    for accumulator in accumulators:
+        if days is not None and len(forecast) >= days:
+            break
+        if not accumulator.reaches_midday():
+            break
+        forecast.append(accumulator.to_forecast())
+
+    return forecast
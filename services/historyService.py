@@ -0,0 +1,247 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from contracts.contracts import ForecastSeries, LocationData, ObservationSeries, WeatherDataCurrent
+from core.config import HISTORY_BATCH, HISTORY_FILE, HISTORY_QUEUE
+from core.exceptions import eprint
+from core.metrics import metrics
+from core.utils import resource
+from services.cacheService import WeatherCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS observations (
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    dt INTEGER NOT NULL,
+    temp REAL NOT NULL,
+    feels_like REAL NOT NULL,
+    icon TEXT,
+    description TEXT NOT NULL,
+    tz_offset INTEGER NOT NULL,
+    PRIMARY KEY (lat, lon, dt)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS forecast_runs (
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    issued_at INTEGER NOT NULL,
+    tz_offset INTEGER NOT NULL,
+    PRIMARY KEY (lat, lon, issued_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS forecast_steps (
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    issued_at INTEGER NOT NULL,
+    dt INTEGER NOT NULL,
+    temp REAL NOT NULL,
+    pop REAL NOT NULL,
+    PRIMARY KEY (lat, lon, issued_at, dt)
+) WITHOUT ROWID;
+'''
+
+INSERT_OBSERVATION = 'INSERT OR IGNORE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+INSERT_FORECAST_RUN = 'INSERT OR IGNORE INTO forecast_runs VALUES (?, ?, ?, ?)'
+INSERT_FORECAST_STEP = 'INSERT OR IGNORE INTO forecast_steps VALUES (?, ?, ?, ?, ?, ?)'
+
+
+class HistoryStore:
+    '''Append-only SQLite history of observations and forecast runs.
+
+    Records are queued and committed by a background writer, one
+    transaction per batch, so a crash loses whole batches, never half of
+    one. Queries read committed data through per-thread connections.
+    The file and the writer are created on first use. With path None, or
+    once the file fails to open, every call is a no-op. Records past
+    queue_size waiting ones are dropped.
+    '''
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str | None = HISTORY_FILE, batch_size: int = HISTORY_BATCH, queue_size: int = HISTORY_QUEUE):
+        self.path = None if path is None else resource(path)
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._writer = None
+        self._open_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> 'HistoryStore':
+        '''Return the process-wide store at HISTORY_FILE.'''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def record_current(self, location: LocationData, current: WeatherDataCurrent) -> None:
+        '''Queue an observation, ignored if location already has one at its dt.'''
+        if self.path is None or not self._open():
+            return
+
+        lat, lon = WeatherCache.key(location)
+        self._put([(INSERT_OBSERVATION, [(
+            lat, lon, current.dt, current.t, current.t_feels_like,
+            current.icon, current.description, current.tz_offset,
+        )])])
+
+    def record_forecast(self, location: LocationData, series: ForecastSeries, issued_at: int) -> None:
+        '''Queue a forecast run fetched at unix time issued_at.'''
+        if self.path is None or not self._open():
+            return
+
+        lat, lon = WeatherCache.key(location)
+        self._put([
+            (INSERT_FORECAST_RUN, [(lat, lon, issued_at, series.tz_offset)]),
+            (INSERT_FORECAST_STEP, [
+                (lat, lon, issued_at, dt, temp, pop)
+                for dt, temp, pop in zip(series.dt, series.temp, series.pop)
+            ]),
+        ])
+
+    def observations(self, location: LocationData, since: float, until: float | None = None) -> ObservationSeries:
+        '''Return observations of location with since <= dt < until, oldest first.'''
+        if self.path is None or not self._open():
+            return ObservationSeries(dt=array('q'), temp=array('d'), feels_like=array('d'))
+
+        lat, lon = WeatherCache.key(location)
+        with metrics.span('history.query'):
+            rows = self._reader().execute(
+                'SELECT dt, temp, feels_like, tz_offset FROM observations '
+                'WHERE lat = ? AND lon = ? AND dt >= ? AND dt < ? ORDER BY dt',
+                (lat, lon, int(since), int(until if until is not None else time.time() + 1)),
+            ).fetchall()
+
+        return ObservationSeries(
+            dt=array('q', (row[0] for row in rows)),
+            temp=array('d', (row[1] for row in rows)),
+            feels_like=array('d', (row[2] for row in rows)),
+            tz_offset=rows[-1][3] if rows else 0,
+        )
+
+    def forecast_run(self, location: LocationData, issued_before: float | None = None) -> ForecastSeries | None:
+        '''Return the latest forecast run of location issued before issued_before, None if there is none.'''
+        if self.path is None or not self._open():
+            return None
+
+        lat, lon = WeatherCache.key(location)
+        reader = self._reader()
+        with metrics.span('history.query'):
+            run = reader.execute(
+                'SELECT issued_at, tz_offset FROM forecast_runs '
+                'WHERE lat = ? AND lon = ? AND issued_at < ? ORDER BY issued_at DESC LIMIT 1',
+                (lat, lon, int(issued_before if issued_before is not None else time.time() + 1)),
+            ).fetchone()
+            if run is None:
+                return None
+
+            rows = reader.execute(
+                'SELECT dt, temp, pop FROM forecast_steps '
+                'WHERE lat = ? AND lon = ? AND issued_at = ? ORDER BY dt',
+                (lat, lon, run[0]),
+            ).fetchall()
+
+        return ForecastSeries(
+            dt=array('q', (row[0] for row in rows)),
+            temp=array('d', (row[1] for row in rows)),
+            pop=array('d', (row[2] for row in rows)),
+            tz_offset=run[1],
+        )
+
+    def flush(self) -> None:
+        '''Block until every queued record is committed.'''
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        '''Commit queued records and stop the writer.'''
+        if self._writer is None or not self._writer.is_alive():
+            return
+        self._queue.put(None)
+        self._writer.join()
+
+    def _open(self) -> bool:
+        '''Create the schema and start the writer, once. Return False when history is off.'''
+        if self._writer is not None:
+            return True
+        with self._open_lock:
+            if self._writer is not None:
+                return True
+            if self.path is None:
+                return False
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                connection = self._connect()
+                try:
+                    with connection:
+                        connection.executescript(SCHEMA)
+                finally:
+                    connection.close()
+            except (OSError, sqlite3.Error) as error:
+                # refreshes go on without history
+                metrics.increment('history.error')
+                eprint(error)
+                self.path = None
+                return False
+
+            writer = threading.Thread(
+                target=self._write, name='history', daemon=True)
+            writer.start()
+            atexit.register(self.close)
+            self._writer = writer
+            return True
+
+    def _put(self, statements: list) -> None:
+        try:
+            self._queue.put_nowait(statements)
+        except queue.Full:
+            metrics.increment('history.dropped')
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')  # readers never block the writer
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _write(self) -> None:
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not None]
+            try:
+                with metrics.span('history.write'), connection:
+                    for statements in records:
+                        for sql, rows in statements:
+                            connection.executemany(sql, rows)
+            except sqlite3.Error as error:
+                metrics.increment('history.error')
+                eprint(error)
+            else:
+                logger = logging.getLogger('app')
+                logger.debug(f'History: committed {len(records)} records')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if len(records) < len(batch):
+                connection.close()
+                return
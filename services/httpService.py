@@ -0,0 +1,235 @@
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from contracts.contracts import RequestTiming
+from core.breaker import CircuitBreaker
+from core.config import (HTTP_HEDGE_AFTER, HTTP_POOL_SIZE, HTTP_TIMEOUT,
+                         HTTP_TIMINGS_KEPT, RATE_LIMIT_RETRIES)
+from core.metrics import metrics
+from core.ratelimit import BACKGROUND, RateLimiter, call_priority
+
+
+# requests' exceptions, so callers handling RequestException handle them too
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    '''Upstream call refused while the upstream's circuit breaker is open.'''
+
+
+class RateLimitExpired(requests.exceptions.Timeout):
+    '''A call gave up waiting for a rate limit token.'''
+
+
+class HttpService:
+    '''Shared HTTP transport: pooled keep-alive session and concurrent calls.'''
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix='http')
+        self.timings: deque[RequestTiming] = deque(maxlen=HTTP_TIMINGS_KEPT)
+
+    @classmethod
+    def shared(cls) -> 'HttpService':
+        '''Return the process-wide transport used by every service.'''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def get(
+        self,
+        url: str,
+        params: dict | None = None,
+        headers: dict | None = None,
+        upstream: str | None = None,
+        timeout: tuple[float, float] = HTTP_TIMEOUT,
+        expires_at: float | None = None,
+        on_send: Callable[[], object] | None = None,
+    ) -> requests.Response:
+        '''GET url over the pooled session, each socket wait bounded by timeout.
+
+        With upstream, the call first passes its circuit breaker, raising
+        CircuitOpenError right away while it is open, then its rate limiter.
+        A 429 answer pauses the limiter; background calls then wait their
+        turn again, up to RATE_LIMIT_RETRIES times, user calls get the answer.
+        A call still waiting for a token at expires_at, in time.monotonic(),
+        leaves the queue and raises requests' Timeout. on_send is called
+        right before the request goes out.
+        '''
+        if upstream is None:
+            if on_send is not None:
+                on_send()
+            return self._get(url, params, headers, timeout)
+
+        breaker = CircuitBreaker.shared(upstream)
+        if not breaker.allow():
+            raise CircuitOpenError(f'{upstream} is not answering, skipped for up to {breaker.reset:.0f} s')
+
+        limiter = RateLimiter.shared(upstream)
+        try:
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                if limiter is not None:
+                    left = None if expires_at is None else expires_at - time.monotonic()
+                    if limiter.acquire(left) is None:
+                        breaker.cancel()
+                        raise RateLimitExpired(f'No {upstream} rate limit token before the deadline')
+                if on_send is not None:
+                    on_send()
+                response = self._get(url, params, headers, timeout)
+                if response.status_code != 429 or limiter is None:
+                    break
+
+                limiter.pause(retry_after(response.headers, 1 / limiter.rate))
+                if call_priority.get() != BACKGROUND:
+                    break
+        except RateLimitExpired:
+            raise
+        except Exception:
+            breaker.record(False)
+            raise
+
+        breaker.record(response.status_code < 500)
+        return response
+
+    def _get(self, url: str, params: dict | None, headers: dict | None, timeout: tuple[float, float]) -> requests.Response:
+        start = time.perf_counter()
+        status = None
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            status = response.status_code
+            return response
+        finally:
+            timing = RequestTiming(
+                url=url,
+                status=status,
+                elapsed=time.perf_counter() - start,
+            )
+            self.timings.append(timing)
+
+            metrics.observe(f'http {urlsplit(url).path}', timing.elapsed)
+            if status is None or status >= 400:
+                metrics.increment('http.error')
+
+            logger = logging.getLogger('app')
+            logger.debug(
+                f'HTTP: {timing}',
+                extra={'stage': 'http', 'duration': timing.elapsed, 'status': status},
+            )
+
+    def get_all(
+        self,
+        *calls: tuple,
+        deadline: float | None = None,
+        hedge_after: float | None = HTTP_HEDGE_AFTER,
+    ) -> list[requests.Response]:
+        '''Run several GET calls, each a tuple of get arguments, concurrently. Return responses in call order.
+
+        A call unanswered hedge_after sec after its request went out is sent
+        once more and the first answer wins; calls queued for a rate limit
+        token are not hedged. Raises requests' Timeout when the calls are not
+        all answered deadline sec in; stragglers finish in the background and
+        the ones still queued leave the queue.
+        '''
+        start = time.monotonic()
+        expires_at = None if deadline is None else start + deadline
+        attempts = [[self._submit(call, remaining(deadline, 0.0), expires_at)] for call in calls]
+        answers: list[Future | None] = [None] * len(calls)
+        while True:
+            for index, tries in enumerate(attempts):
+                if answers[index] is None:
+                    answers[index] = first_answer([attempt.future for attempt in tries])
+            pending = [
+                attempt.future
+                for tries, answer in zip(attempts, answers) if answer is None
+                for attempt in tries
+            ]
+            if not pending:
+                break
+
+            now = time.monotonic()
+            if deadline is not None and now - start >= deadline:
+                metrics.increment('http.deadline')
+                raise requests.exceptions.Timeout(f'No answer within the {deadline:g} s deadline')
+
+            wake_ups = [] if expires_at is None else [expires_at - now]
+            hedged = False
+            if hedge_after is not None:
+                for index, tries in enumerate(attempts):
+                    if answers[index] is not None or len(tries) > 1:
+                        continue
+                    sent_at = tries[0].sent_at
+                    if sent_at is None:
+                        wake_ups.append(hedge_after)  # still queued, hedged hedge_after after it goes out at the earliest
+                    elif now - sent_at >= hedge_after:
+                        tries.append(self._submit(calls[index], remaining(deadline, now - start), expires_at))
+                        metrics.increment('http.hedged')
+                        hedged = True
+                    else:
+                        wake_ups.append(sent_at + hedge_after - now)
+            if hedged:
+                continue  # wait for the hedges too
+
+            wait(pending, timeout=min(wake_ups, default=None), return_when=FIRST_COMPLETED)
+
+        for tries, answer in zip(attempts, answers):
+            if answer is not tries[0].future:
+                metrics.increment('http.hedge_won')
+        return [answer.result() for answer in answers]
+
+    def _submit(self, call: tuple, timeout: tuple[float, float], expires_at: float | None) -> 'Attempt':
+        attempt = Attempt()
+        # copied context: the calls keep the priority lane of the caller
+        attempt.future = self.executor.submit(
+            contextvars.copy_context().run, self.get, *call,
+            timeout=timeout, expires_at=expires_at, on_send=attempt.send)
+        return attempt
+
+
+class Attempt:
+    '''One request of a get_all call: its future and when it went out, None while queued.'''
+
+    def __init__(self):
+        self.future: Future | None = None
+        self.sent_at: float | None = None
+
+    def send(self) -> None:
+        self.sent_at = time.monotonic()
+
+
+def remaining(deadline: float | None, elapsed: float) -> tuple[float, float]:
+    '''Return HTTP_TIMEOUT cut to what is left of deadline, so a stalled call fails by itself.'''
+    if deadline is None:
+        return HTTP_TIMEOUT
+    left = max(deadline - elapsed, 0.001)
+    return tuple(min(limit, left) for limit in HTTP_TIMEOUT)
+
+
+def first_answer(futures: list[Future]) -> Future | None:
+    '''Return the first of futures that answered, or the first one once all failed, None while waiting.'''
+    for future in futures:
+        if future.done() and future.exception() is None:
+            return future
+    if all(future.done() for future in futures):
+        return futures[0]
+    return None
+
+
+def retry_after(headers, default: float) -> float:
+    '''Return the Retry-After delay of a response, in sec, default when missing or a date.'''
+    value = headers.get('Retry-After', '')
+    return float(value) if value.isdigit() else default
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import RequestException
+from contracts import bundle, snapshot
+from core.config import (ICON_BASE_URL, ICON_BUNDLE_FILE, ICON_DIR, ICON_IDS,
+                         ICON_MANIFEST_FILE, ICON_SCALES, ICON_SYNC_BACKOFF,
+                         ICON_SYNC_RETRIES, ICON_SYNC_WORKERS)
+from core.metrics import metrics
+from core.utils import resource
+from services.httpService import HttpService
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+DOWNLOADED = 'downloaded'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+
+def icon_files() -> list[str]:
+    '''Return file names of every icon variant the widgets may show.'''
+    return [f'{icon}{scale}.png' for icon in ICON_IDS for scale in ICON_SCALES]
+
+
+def sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class IconSync:
+    '''Mirror OpenWeather's icons into directory and pack them into one bundle.
+
+    The manifest keeps the sha256, ETag and Last-Modified of every icon
+    file. Icons whose file still matches its hash are requested
+    conditionally, so only changed icons are downloaded, and the manifest
+    is saved after every download: an interrupted sync resumes where it
+    stopped.
+    '''
+
+    def __init__(
+        self,
+        base_url: str = ICON_BASE_URL,
+        directory: str = ICON_DIR,
+        manifest: str = ICON_MANIFEST_FILE,
+        http: HttpService | None = None,
+        workers: int = ICON_SYNC_WORKERS,
+        retries: int = ICON_SYNC_RETRIES,
+        backoff: float = ICON_SYNC_BACKOFF,
+    ):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.directory = resource(directory)
+        self.manifest_path = resource(manifest)
+        self.http = http or HttpService.shared()
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+
+    def sync(self, names: list[str] | None = None) -> dict[str, str]:
+        '''Download changed icon files, return DOWNLOADED, UNCHANGED or FAILED per name.'''
+        names = icon_files() if names is None else names
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='icons') as executor:
+            results = dict(zip(names, executor.map(self._sync_file, names)))
+
+        logger = logging.getLogger('app')
+        logger.info('Icons: {} downloaded, {} unchanged, {} failed'.format(
+            *(list(results.values()).count(status) for status in (DOWNLOADED, UNCHANGED, FAILED))))
+        return results
+
+    def pack(self, path: str = ICON_BUNDLE_FILE, names: list[str] | None = None) -> int:
+        '''Write icon files found in directory to the bundle at path, return how many it holds.'''
+        files = {}
+        for name in icon_files() if names is None else names:
+            content = snapshot.read(os.path.join(self.directory, name))
+            if content is None:
+                continue
+            files[name] = content
+
+            digest = sha256(content)
+            if self.manifest.get(name, {}).get('sha256') != digest:
+                # changed by hand, its validators belong to other bytes
+                self._record(name, sha256=digest, etag=None, last_modified=None)
+
+        snapshot.write(resource(path), bundle.pack(files))
+        self._save_manifest()
+
+        logger = logging.getLogger('app')
+        logger.info(f'Icons: packed {len(files)} files into {path}')
+        return len(files)
+
+    def _sync_file(self, name: str) -> str:
+        filename = os.path.join(self.directory, name)
+        record = self.manifest.get(name, {})
+        content = snapshot.read(filename)
+
+        # validators only vouch for the file the manifest hashed
+        headers = {}
+        if content is not None and record.get('sha256') == sha256(content):
+            if record.get('etag'):
+                headers['If-None-Match'] = record['etag']
+            if record.get('last_modified'):
+                headers['If-Modified-Since'] = record['last_modified']
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                metrics.increment('icons.retry')
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                response = self.http.get(self.base_url + name, headers=headers)
+            except RequestException as error:
+                status = f'{type(error).__name__}: {error}'
+                continue
+
+            if response.status_code == 304:
+                metrics.increment('icons.not_modified')
+                return UNCHANGED
+
+            if response.status_code == 200 and response.content.startswith(PNG_SIGNATURE):
+                return self._store(name, filename, content, response)
+
+            status = f'HTTP {response.status_code}'
+            if response.status_code == 200:
+                status = 'not a png'
+            elif response.status_code < 500:
+                break  # a missing icon will not appear by retrying
+
+        metrics.increment('icons.failed')
+        logger = logging.getLogger('app')
+        logger.warning(f'Icons: {name} failed, {status}')
+        return FAILED
+
+    def _store(self, name: str, filename: str, previous: bytes | None, response) -> str:
+        content = response.content
+        digest = sha256(content)
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+        if previous is not None and sha256(previous) == digest:
+            # same bytes under new validators
+            self._record(name, sha256=digest, **validators)
+            self._save_manifest()
+            return UNCHANGED
+
+        snapshot.write(filename, content)
+        metrics.increment('icons.downloaded')
+        self._record(name, sha256=digest, **validators)
+        self._save_manifest()
+        return DOWNLOADED
+
+    def _record(self, name: str, **fields) -> None:
+        with self._lock:
+            self.manifest.setdefault(name, {}).update(fields)
+
+    def _load_manifest(self) -> dict[str, dict]:
+        content = snapshot.read(self.manifest_path)
+        if content is None:
+            return {}
+        try:
+            return json.loads(content)
+        except ValueError:
+            return {}  # every icon is downloaded again
+
+    def _save_manifest(self) -> None:
+        with self._lock:
+            content = json.dumps(self.manifest, indent=2, sort_keys=True)
+            snapshot.write(self.manifest_path, content.encode())
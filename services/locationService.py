@@ -1,75 +1,106 @@
-import json
 import logging
-import os
-import requests
 from requests.exceptions import RequestException
+from contracts import snapshot
 from contracts.contracts import LocationData
 from core.utils import resource
-from core.exceptions import eprint, LocationServerError
-from core.config import API_KEY, GEOLOCAL_URL, IPINFO_URL
+from core.exceptions import eprint, LocationServerError, SnapshotError
+from core.metrics import metrics
+from core.config import LOCATION_FILE, get_settings
+from services.cityIndex import CityIndex
+from services.httpService import HttpService
 
 
 class LocationService:
+    '''Locate by ip or by city name. The last ip location is kept in path, with path None it is not kept.'''
+
+    def __init__(
+        self,
+        http: HttpService | None = None,
+        city_index: CityIndex | None = None,
+        path: str | None = LOCATION_FILE,
+    ):
+        self.http = http or HttpService.shared()
+        self._city_index = city_index
+        self.path = None if path is None else resource(path)
+
+    @property
+    def city_index(self) -> CityIndex:
+        '''Local city index, loaded on first use.'''
+        if self._city_index is None:
+            self._city_index = CityIndex.shared()
+        return self._city_index
+
     def get_location(self) -> LocationData:
         '''Return last fetched location.'''
         return self.location
 
+    @metrics.timed('location.fetch_current')
     def fetch_current(self) -> LocationData:
-        '''Get current location by ip.'''
+        '''Get current location by ip, or the last one found when the lookup fails.'''
+        status = 'ok'
         try:
-            response = requests.get(IPINFO_URL)
-            if response.status_code == 200:
-                data = response.json()
-
-                filename = os.path.join('.', '.location.json')
-                with open(resource(filename), 'w') as file:
-                    json.dump(data, file)
-
-            else:
-                raise LocationServerError()
+            data = self.request_current()
+            lat, lon = map(float, data['loc'].split(','))
+            location = LocationData(
+                country=data['country'],
+                city=data['city'],
+                lat=lat,
+                lon=lon,
+            )
+
+            if self.path is not None:
+                try:
+                    with metrics.span('location.write'):
+                        snapshot.write(self.path, snapshot.encode_location(location))
+                except OSError as error:
+                    eprint(error)  # the location is found, only not kept
 
         except (LocationServerError, RequestException) as error:
+            metrics.increment('location.fallback')
             eprint(error)
+            status = f'{type(error).__name__}: {error}'
 
-            filename = os.path.join('.', '.location.json')
-            if os.path.exists(resource(filename)):
-                with open(resource(filename), 'r') as file:
-                    data = json.load(file)
-
-            else:
-                data = {
-                    'city': 'Location not found',
-                    'country': 'try again',
-                    'loc': '-23.5475,-46.6361'
-                }
-
-        country = data['country']
-        city = data['city']
-        lat, lon = map(float, data['loc'].split(','))
+            location = self.last_location() or LocationData(
+                country='try again',
+                city='Location not found',
+                lat=-23.5475,
+                lon=-46.6361,
+            )
 
         logger = logging.getLogger('app')
-        logger.info(f'Location: {city}, {country}')
-
-        self.location = LocationData(
-            country=country,
-            city=city,
-            lat=lat,
-            lon=lon,
+        logger.info(
+            f'Location: {location.city}, {location.country}',
+            extra={'location': location.city, 'stage': 'location', 'status': status},
         )
+
+        self.location = location
         return self.location
 
-    def fetch_by_city(self, city: str) -> LocationData:
-        '''Get current location by inserted location.'''
+    def last_location(self) -> LocationData | None:
+        '''Return the location last found by ip, None if there is none.'''
+        if self.path is None:
+            return None
         try:
-            response = requests.get(
-                f'{GEOLOCAL_URL}?q={city}&limit=1&appid={API_KEY}')
+            content = snapshot.read(self.path)
+            return None if content is None else snapshot.decode_location(content)
+        except (OSError, SnapshotError) as error:
+            eprint(error)
+            return None
 
-            if response.status_code == 200 and len(response.json()) != 0:
-                data = response.json()
-            else:
-                raise LocationServerError()
+    @metrics.timed('location.fetch_by_city')
+    def fetch_by_city(self, city: str) -> LocationData:
+        '''Get current location by inserted location, from the city index when possible.'''
+        location = self.city_index.resolve(city)
+        if location is not None:
+            metrics.increment('location.index_hit')
+            self.location = location
+            return self.location
+
+        try:
+            data = self.request_city(city)
 
         except (LocationServerError, RequestException) as error:
+            metrics.increment('location.fallback')
             eprint(error)
             data = [
                 {
@@ -92,3 +123,24 @@ class LocationService:
             lon=lon,
         )
         return self.location
+
+    def request_current(self) -> dict:
+        '''Return ipinfo's answer for this machine: city, country and "lat,lon" loc.'''
+        response = self.http.get(
+            get_settings().ipinfo_url, upstream='ipinfo')
+        if response.status_code != 200:
+            raise LocationServerError()
+        return response.json()
+
+    def request_city(self, city: str) -> list[dict]:
+        '''Return the geocoder's matches of city, each with name, country, lat and lon.'''
+        settings = get_settings()
+        response = self.http.get(
+            settings.geolocal_url,
+            params={'q': city, 'limit': 1, 'appid': settings.api_key},
+            upstream='openweather',
+        )
+
+        if response.status_code != 200 or len(response.json()) == 0:
+            raise LocationServerError()
+        return response.json()
@@ -0,0 +1,158 @@
+import dataclasses
+import logging
+import threading
+import time
+from collections import OrderedDict
+from requests.exceptions import RequestException
+from contracts.contracts import LocationData, WeatherData
+from core.config import CACHE_MAX_SIZE, get_settings
+from core.exceptions import eprint, LocationServerError, WeatherServerError
+from core.metrics import metrics
+from services.cacheService import WeatherCache
+from services.cityIndex import CityIndex
+from services.historyService import HistoryStore
+from services.httpService import HttpService
+from services.locationService import LocationService
+from services.weatherService import WeatherService
+
+
+def max_age(headers) -> float:
+    '''Return the max-age of a Cache-Control header, in sec, 0 when missing.'''
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name == 'max-age' and value.isdigit():
+            return float(value)
+    return 0.0
+
+
+class RemoteLocationService(LocationService):
+    '''LocationService asking a weather server (python -m weather --serve) instead of ipinfo and the geocoder.'''
+
+    def __init__(self, base_url: str, http: HttpService | None = None, city_index: CityIndex | None = None):
+        super().__init__(http, city_index)
+        self.base_url = base_url.rstrip('/') + '/'
+
+    def request_current(self) -> dict:
+        response = self.http.get(self.base_url + 'location', upstream='weather-server')
+        if response.status_code != 200:
+            raise LocationServerError()
+
+        data = response.json()
+        return {
+            'city': data['city'],
+            'country': data['country'],
+            'loc': f'{data["lat"]},{data["lon"]}',
+        }
+
+    def request_city(self, city: str) -> list[dict]:
+        response = self.http.get(
+            self.base_url + 'location', params={'city': city}, upstream='weather-server')
+        if response.status_code != 200:
+            raise LocationServerError()
+
+        data = response.json()
+        return [{
+            'name': data['city'],
+            'country': data['country'],
+            'lat': data['lat'],
+            'lon': data['lon'],
+        }]
+
+
+class RemoteWeatherService(WeatherService):
+    '''WeatherService asking a weather server (python -m weather --serve) instead of OpenWeather.
+
+    The last answers of up to max_size locations are kept, least recently
+    used first out, for fallbacks, cached and expires_at.
+    '''
+
+    def __init__(self, base_url: str, http: HttpService | None = None, max_size: int = CACHE_MAX_SIZE):
+        # the server caches and records upstream data, the local cache only groups locations
+        super().__init__(http, WeatherCache(directory=None), HistoryStore(path=None))
+        self.base_url = base_url.rstrip('/') + '/'
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._results: OrderedDict[tuple[float, float], tuple[WeatherData, float]] = OrderedDict()
+
+    def get(self, location: LocationData) -> WeatherData:
+        '''Get weather info of location from the server, or the last answer if it fails.'''
+        key = self.cache.key(location)
+        start = time.perf_counter()
+        try:
+            response = self.http.get(self.base_url + 'weather', params={
+                'lat': location.lat,
+                'lon': location.lon,
+                'city': location.city,
+                'country': location.country,
+            }, upstream='weather-server')
+            if response.status_code != 200:
+                raise WeatherServerError(f'Weather server answered {response.status_code}')
+
+            with metrics.span('json.decode'):
+                data = response.json()
+            weather = WeatherData.from_dict(data['weather_data'])
+            self._store(key, (weather, time.time() + max_age(response.headers)))
+
+        except (RequestException, WeatherServerError) as error:
+            eprint(error)
+            result = self._result(location)
+            if result is None:
+                metrics.increment('weather.error')
+                raise WeatherServerError(
+                    f'No cached weather for {location.city}') from error
+
+            metrics.increment('weather.fallback')
+            weather = dataclasses.replace(
+                result[0],
+                flag=False,
+                error=f'{type(error).__name__}: {error}',
+            )
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('weather.get', elapsed)
+
+        logger = logging.getLogger('app')
+        logger.debug(
+            f'Weather: refreshed from server in {elapsed * 1000:.0f} ms',
+            extra={
+                'location': location.city,
+                'stage': 'weather',
+                'duration': elapsed,
+                'status': 'ok' if weather.flag else weather.error,
+            },
+        )
+        return weather
+
+    def cached(self, location: LocationData) -> WeatherData | None:
+        result = self._result(location)
+        return None if result is None else dataclasses.replace(result[0], flag=False)
+
+    def expires_at(self, location: LocationData) -> float | None:
+        result = self._result(location)
+        return None if result is None else result[1]
+
+    def _result(self, location: LocationData) -> tuple[WeatherData, float] | None:
+        key = self.cache.key(location)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def _store(self, key: tuple[float, float], result: tuple[WeatherData, float]) -> None:
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+
+def create_services() -> tuple[LocationService, WeatherService]:
+    '''Return location and weather services, reading WEATHER_SERVER_URL when it is set.'''
+    url = get_settings().weather_server_url
+    if url is None:
+        return LocationService(), WeatherService()
+
+    logger = logging.getLogger('app')
+    logger.info(f'Weather: using server {url}')
+    return RemoteLocationService(url), RemoteWeatherService(url)
@@ -1,80 +1,215 @@
 
-import json
+import contextvars
 import logging
-import os
-import datetime
-import requests
-import calendar
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException
 from contracts.contracts import *
 from core.config import *
-from core.utils import resource
 from core.exceptions import eprint, WeatherServerError
+from core.metrics import metrics
+from services.cacheService import WeatherCache
+from services.forecastAggregator import aggregate_forecast
+from services.historyService import HistoryStore
+from services.httpService import HttpService
 
 
 class WeatherService:
+    def __init__(
+        self,
+        http: HttpService | None = None,
+        cache: WeatherCache | None = None,
+        history: HistoryStore | None = None,
+        deadline: float = REFRESH_DEADLINE,
+    ):
+        self.http = http or HttpService.shared()
+        self.cache = cache or WeatherCache()
+        self.history = history or HistoryStore.shared()
+        self.deadline = deadline
+
     def get(self, location: LocationData) -> WeatherData:
         '''Get weather info from a given location.'''
+        settings = get_settings()
+        params = {
+            'lat': location.lat,
+            'lon': location.lon,
+            'units': UNITS,
+            'exclude': EXCLUDE,
+            'appid': settings.api_key,
+        }
+        urls = {
+            'weather': settings.weather_url,
+            'forecast': settings.forecast_url,
+        }
+        start = time.perf_counter()
+        now = time.time()
+
+        entries = {kind: self.cache.get_entry(location, kind) for kind in urls}
+        calls = {
+            kind: (urls[kind], params, entry.validators() if entry else None, 'openweather')
+            for kind, entry in entries.items()
+            if entry is None or not entry.is_fresh(now)
+        }
+        metrics.increment('cache.hit', len(entries) - len(calls))
+        metrics.increment('cache.miss', len(calls))
+        fetched = set()
         try:
-            response = requests.get(
-                f'{WEATHER_URL}?lat={location.lat}&lon={location.lon}&units={
-                    UNITS}&exclude={EXCLUDE}&appid={API_KEY}'
-            )
-
-            if response.status_code == 200:
-                flag = True
-                weather_data = response.json()
-                filename = os.path.join('.', '.weather.json')
-                with open(resource(filename), 'w') as file:
-                    json.dump(weather_data, file)
-            else:
-                raise WeatherServerError()
-
-            response = requests.get(
-                f'{FORECAST_URL}?lat={location.lat}&lon={location.lon}&units={
-                    UNITS}&exclude={EXCLUDE}&appid={API_KEY}'
-            )
+            responses = dict(zip(calls, self.http.get_all(*calls.values(), deadline=self.deadline)))
+            for kind, response in responses.items():
+                if response.status_code == 304 and entries[kind] is not None:
+                    metrics.increment('cache.revalidated')
+                    entries[kind] = self.cache.revalidate(location, kind, entries[kind])
+                elif response.status_code == 200:
+                    with metrics.span('json.decode'):
+                        data = response.json()
+                    try:
+                        processed = self.process(kind, data)
+                    except (KeyError, IndexError, TypeError, ValueError) as error:
+                        # a malformed answer falls back to the cache like a failed call
+                        metrics.increment('weather.malformed')
+                        raise WeatherServerError(
+                            f'Malformed {kind} payload, {type(error).__name__}: {error}') from error
+                    entries[kind] = self.cache.put(
+                        location,
+                        kind,
+                        processed,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                    )
+                    fetched.add(kind)
+                else:
+                    raise WeatherServerError()
 
-            if response.status_code == 200:
-                flag = True
-                forecast_data = response.json()
-                filename = os.path.join('.', '.forecast.json')
-                with open(resource(filename), 'w') as file:
-                    json.dump(forecast_data, file)
-            else:
-                raise WeatherServerError()
+            flag = True
 
         except (RequestException, WeatherServerError) as error:
             flag = False
+            status = f'{type(error).__name__}: {error}'
             eprint(error)
-            filename = os.path.join('.', '.weather.json')
-            if os.path.exists(resource(filename)):
-                with open(resource(filename), 'r') as file:
-                    weather_data = json.load(file)
-            else:
-                weather_data = {}
-
-            filename = os.path.join('.', '.forecast.json')
-            if os.path.exists(resource(filename)):
-                with open(resource(filename), 'r') as file:
-                    forecast_data = json.load(file)
-            else:
-                forecast_data = {}
-
-        current = self.process_current_weather_data(weather_data)
-        forecast = self.process_forecast_data(forecast_data)
+            if entries['weather'] is None or entries['forecast'] is None:
+                metrics.increment('weather.error')
+                raise WeatherServerError(
+                    f'No cached weather for {location.city}') from error
+
+            metrics.increment('weather.fallback')
+
+        # processed once per upstream payload, in memory or from the snapshot
+        metrics.increment('weather.process_skipped', len(entries) - len(fetched))
+        current = entries['weather'].processed
+        forecast, series = entries['forecast'].processed
+
+        if 'weather' in fetched:
+            self.history.record_current(location, current)
+        if 'forecast' in fetched:
+            self.history.record_forecast(location, series, issued_at=int(now))
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('weather.get', elapsed)
 
         logger = logging.getLogger('app')
-        logger.info('Weather: {}'.format(
-            f'Weather: {current}' if flag else 'Weather: service error!',
-        ))
+        logger.debug(f'Weather: refreshed in {elapsed * 1000:.0f} ms')
+        logger.info(
+            'Weather: {}'.format(
+                f'Weather: {current}' if flag else 'Weather: service error!',
+            ),
+            extra={
+                'location': location.city,
+                'stage': 'weather',
+                'duration': elapsed,
+                'status': 'ok' if flag else status,
+            },
+        )
 
         return WeatherData(
             flag=flag,
             current=current,
-            forecast=tuple(forecast),
+            forecast=forecast,
+            error=None if flag else status,
+            series=series,
+        )
+
+    def get_many(
+        self,
+        locations: Iterable[LocationData],
+        max_workers: int = BATCH_MAX_WORKERS,
+    ) -> dict[LocationData, WeatherData]:
+        '''Get weather info for several locations, at most max_workers at a time.
+
+        Locations sharing the same cache key are fetched once.
+        '''
+        groups: dict[tuple, list[LocationData]] = {}
+        for location in locations:
+            groups.setdefault(self.cache.key(location), []).append(location)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather') as executor:
+            futures = {
+                key: executor.submit(contextvars.copy_context().run, self._get_or_error, group[0])
+                for key, group in groups.items()
+            }
+
+        return {
+            location: futures[key].result()
+            for key, group in groups.items()
+            for location in group
+        }
+
+    def cached(self, location: LocationData) -> WeatherData | None:
+        '''Return last cached weather of location however old, without network I/O, None if not cached.
+
+        flag is False as nothing was confirmed by upstream yet.
+        '''
+        with metrics.span('weather.cached'):
+            current = self.cache.get(location, 'weather', fresh=False)
+            forecast = self.cache.get(location, 'forecast', fresh=False)
+        if current is None or forecast is None:
+            return None
+
+        forecast, series = forecast
+        return WeatherData(
+            flag=False,
+            current=current,
+            forecast=forecast,
+            series=series,
         )
 
+    def expires_at(self, location: LocationData) -> float | None:
+        '''Return unix time at which cached weather of location may be outdated, None if not cached.'''
+        entries = [self.cache.get_entry(location, kind) for kind in ('weather', 'forecast')]
+        if None in entries:
+            return None
+        return min(entry.expires_at for entry in entries)
+
+    def process(self, kind: str, data: dict):
+        '''Process raw api kind response to what the cache keeps and WeatherData holds.'''
+        if kind == 'weather':
+            return self.process_current_weather_data(data)
+
+        return (
+            tuple(self.process_forecast_data(data)),
+            self.process_forecast_series(data),
+        )
+
+    def _get_or_error(self, location: LocationData) -> WeatherData:
+        try:
+            return self.get(location)
+        except (WeatherServerError, KeyError, IndexError, TypeError) as error:
+            status = f'{type(error).__name__}: {error}'
+
+            logger = logging.getLogger('app')
+            logger.warning(
+                f'Weather: {location.city} failed, {status}',
+                extra={'location': location.city, 'stage': 'weather', 'status': status},
+            )
+
+            return WeatherData(
+                flag=False,
+                current=None,
+                forecast=(),
+                error=status,
+            )
+
+    @metrics.timed('weather.process_current')
     def process_current_weather_data(self, data) -> WeatherDataCurrent:
         '''Process raw api weather response to WeatherDataCurrent.'''
         return WeatherDataCurrent(
@@ -82,54 +217,23 @@ class WeatherService:
             t=data['main']['temp'],
             t_feels_like=data['main']['feels_like'],
             description=data['weather'][0]['description'],
-            dt=datetime.datetime.fromtimestamp(
-                data['dt']).strftime('%H:%M %d/%m')
+            dt=data['dt'],
+            tz_offset=data.get('timezone', 0),
         )
 
+    @metrics.timed('weather.process_forecast')
     def process_forecast_data(self, data) -> list[WeatherDataForecast]:
         '''Process raw api forecast response to WeatherDataForecast.'''
-        weather_list = [
-            dict(
-                date=datetime.datetime.fromtimestamp(
-                    dayInfo['dt']).strftime('%d/%m'),
-                weekday=calendar.day_name[datetime.datetime.fromtimestamp(
-                    dayInfo['dt']).weekday()],
-                temp_min=dayInfo['main']['temp_min'],
-                temp_max=dayInfo['main']['temp_max'],
-                icon=dayInfo['weather'][0]['icon'],
-                pop=dayInfo['pop'],
-                datetime=dayInfo['dt_txt']
-            )
-            for dayInfo in data['list']
-        ]
-
-        grouped_forecast = self.group_day_forecast(weather_list)
-
-        return [
-            WeatherDataForecast(
-                date=day[0]['date'],
-                weekday=day[0]['weekday'],
-                temp_min=min([float(item['temp_min']) for item in day]),
-                temp_max=max([float(item['temp_max']) for item in day]),
-                midday_icon=day[12 // FORECAST_HOUR_PERIOD]['icon'],
-                max_day_pop=max([float(item['pop']) for item in day])
-            )
-            for day in grouped_forecast
-        ]
-
-    def group_day_forecast(self, forecast_list: list):
-        '''Group forecast data by day. Return a list of compiled hourly forecast for the next (FORECAST_DAYS_SPAN - 1) days.'''
-        grouped_data = []
-        for item in forecast_list:
-            if len(grouped_data) == 0:
-                grouped_data.append([item])
-            else:
-                if item['date'] == grouped_data[-1][0]['date']:
-                    grouped_data[-1].append(item)
-                else:
-                    grouped_data.append([item])
-
-        if len(grouped_data) == FORECAST_DAYS_SPAN + 1:
-            grouped_data = grouped_data[1:]
+        return aggregate_forecast(
+            data['list'],
+            tz_offset=data.get('city', {}).get('timezone', 0),
+            days=FORECAST_DAYS_SPAN - 1,
+        )
 
-        return grouped_data[:-1]
+    @metrics.timed('weather.process_series')
+    def process_forecast_series(self, data) -> ForecastSeries:
+        '''Process raw api forecast response to a columnar ForecastSeries.'''
+        return ForecastSeries.from_entries(
+            data['list'],
+            tz_offset=data.get('city', {}).get('timezone', 0),
+        )
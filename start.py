@@ -1,10 +1,20 @@
 import logging
 import sys
+import time
 from PyQt5 import QtCore, QtWidgets
-from core.config import DEBUG
-from app import MainWindow
+from core.config import DEBUG, configure_logging, get_settings
+from core.metrics import start_metrics
 
 if __name__ == '__main__':
+    started_at = time.perf_counter()
+    configure_logging()
+
+    settings = get_settings()
+    start_metrics(settings.metrics_port, settings.metrics_dump_interval)
+
+    # imported after logging is configured: app creates its services on import
+    from app import MainWindow
+
     if DEBUG:
         logger = logging.getLogger('app')
         logger.debug('app: run.')
@@ -12,7 +22,8 @@ if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
 
     window = MainWindow(flags=QtCore.Qt.Window |
-                        QtCore.Qt.WindowStaysOnTopHint)
+                        QtCore.Qt.WindowStaysOnTopHint,
+                        started_at=started_at)
 
     window.show()
 
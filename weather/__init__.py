@@ -0,0 +1 @@
+'''Headless weather client. Run with `python -m weather`; it never imports PyQt5.'''
@@ -0,0 +1,220 @@
+
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import time
+from contracts.contracts import LocationData, ObservationSeries, WeatherData, check_coordinates
+from core.config import SERVER_BIND, configure_logging, get_settings
+from core.metrics import start_metrics
+from core.ratelimit import BACKGROUND, USER, priority
+from core.scheduler import RefreshScheduler
+from services.cityIndex import import_city_list
+from services.locationService import LocationService
+from services.remoteService import create_services
+from services.weatherService import WeatherService
+from weather.server import WeatherServer
+
+
+def coordinates(value: str) -> tuple[float, float]:
+    '''Return latitude and longitude of a "LAT,LON" argument.'''
+    try:
+        lat, lon = map(float, value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected LAT,LON in degrees, got {value!r}') from None
+
+    try:
+        check_coordinates(lat, lon)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from None
+    return lat, lon
+
+
+def build_parser() -> argparse.ArgumentParser:
+    '''Return the command line parser of the headless client.'''
+    parser = argparse.ArgumentParser(
+        prog='python -m weather',
+        description='Print current weather and forecast without the GUI.',
+    )
+    parser.add_argument(
+        '--city', action='append', default=[],
+        help='city name, may be repeated (default: location by ip)')
+    parser.add_argument(
+        '--coords', action='append', default=[], type=coordinates, metavar='LAT,LON',
+        help='coordinates, may be repeated')
+    parser.add_argument(
+        '--json', action='store_true',
+        help='print json instead of text')
+    parser.add_argument(
+        '--watch', type=float, metavar='SECONDS',
+        help='keep running, refreshing when data expires and at least every SECONDS')
+    parser.add_argument(
+        '--history', type=float, metavar='DAYS',
+        help='print temperatures recorded over the last DAYS instead of fetching')
+    parser.add_argument(
+        '--output', metavar='PATH',
+        help='write each snapshot as json to PATH instead of printing it')
+    parser.add_argument(
+        '--serve', type=int, metavar='PORT',
+        help='serve weather to other clients on PORT, one upstream fetch per location')
+    parser.add_argument(
+        '--bind', default=SERVER_BIND, metavar='ADDRESS',
+        help=f'address --serve listens on (default: {SERVER_BIND})')
+    parser.add_argument(
+        '--import-cities', metavar='PATH',
+        help="build the local city index from OpenWeather's city.list.json.gz and exit")
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help='log debug messages to stderr')
+    return parser
+
+
+def resolve_locations(args: argparse.Namespace, location_service: LocationService, local: bool = False) -> list[LocationData]:
+    '''Return locations requested on the command line.
+
+    Cities come from the city index when it has them. With local, as
+    history is keyed by coordinates, the last location found by ip is used
+    before looking the ip up over the network.
+    '''
+    locations = [location_service.fetch_by_city(city) for city in args.city]
+
+    for lat, lon in args.coords:
+        locations.append(
+            LocationData(country='', city=f'{lat},{lon}', lat=lat, lon=lon))
+
+    if not locations:
+        locations.append(
+            (local and location_service.last_location()) or location_service.fetch_current())
+
+    return locations
+
+
+def to_dict(location: LocationData, weather: WeatherData) -> dict:
+    '''Serialize a location and its weather to plain json types.'''
+    return {
+        'location_data': dataclasses.asdict(location),
+        'weather_data': dataclasses.asdict(weather),
+    }
+
+
+def format_text(location: LocationData, weather: WeatherData) -> str:
+    '''Format a location and its weather as human readable text.'''
+    lines = [', '.join(filter(None, (location.city, location.country)))]
+
+    if weather.current is None:
+        lines.append(f'  unavailable ({weather.error})')
+        return '\n'.join(lines)
+
+    current = weather.current
+    lines.append(
+        f'  {current.description.capitalize()}, {current.t:.0f} C '
+        f'(feels like {current.t_feels_like:.0f} C), updated {current.local_time}'
+        + ('' if weather.flag else ' [stale]')
+    )
+    for day in weather.forecast:
+        lines.append(
+            f'  {day.weekday:<9} {day.date}  '
+            f'min {day.temp_min:.0f} C  max {day.temp_max:.0f} C  '
+            f'precipitation {day.max_day_pop * 100:.0f}%'
+        )
+
+    return '\n'.join(lines)
+
+
+def format_history(location: LocationData, history: ObservationSeries, days: float) -> str:
+    '''Format recorded temperatures of a location as human readable text.'''
+    name = ', '.join(filter(None, (location.city, location.country)))
+    if not history:
+        return f'{name}\n  no observations in the last {days:g} days'
+
+    return (
+        f'{name}\n  {len(history)} observations in the last {days:g} days, '
+        f'min {min(history.temp):.0f} C  max {max(history.temp):.0f} C  '
+        f'mean {sum(history.temp) / len(history):.1f} C'
+    )
+
+
+def write_snapshot(path: str, snapshot: list[dict]) -> None:
+    '''Atomically replace path with snapshot.'''
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(snapshot, file, default=list)
+    os.replace(temporary, path)
+
+
+def run_once(args: argparse.Namespace, locations: list[LocationData], weather_service: WeatherService) -> dict[LocationData, WeatherData]:
+    '''Fetch every location once and print or write the result.'''
+    results = weather_service.get_many(locations)
+
+    if args.output:
+        write_snapshot(args.output, [
+            to_dict(location, weather) for location, weather in results.items()
+        ])
+    elif args.json:
+        print(json.dumps([
+            to_dict(location, weather) for location, weather in results.items()
+        ], indent=2, default=list))
+    else:
+        print('\n\n'.join(
+            format_text(location, weather) for location, weather in results.items()
+        ))
+
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    configure_logging(
+        stream_level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    if args.import_cities:
+        count = import_city_list(args.import_cities)
+        print(f'Indexed {count} cities')
+        return 0
+
+    settings = get_settings()
+    start_metrics(settings.metrics_port, settings.metrics_dump_interval)
+
+    if args.serve is not None:
+        server = WeatherServer().listen(args.serve, args.bind)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            return 0
+
+    location_service, weather_service = create_services()
+    locations = resolve_locations(args, location_service, local=args.history is not None)
+
+    if args.history is not None:
+        since = time.time() - args.history * 24 * 60 * 60
+        print('\n\n'.join(
+            format_history(location, weather_service.history.observations(location, since), args.history)
+            for location in locations
+        ))
+        return 0
+
+    if args.watch is None:
+        run_once(args, locations, weather_service)
+        return 0
+
+    scheduler = RefreshScheduler(interval=args.watch)
+    lane = USER
+    try:
+        while True:
+            with priority(lane):
+                results = run_once(args, locations, weather_service)
+            lane = BACKGROUND  # later runs are timer-driven
+            scheduler.record(all(weather.flag for weather in results.values()))
+
+            expires_at = [weather_service.expires_at(location) for location in locations]
+            delay = scheduler.next_delay(
+                time.time(),
+                None if None in expires_at else min(expires_at),
+            )
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        return 0
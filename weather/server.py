@@ -0,0 +1,204 @@
+import dataclasses
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from requests.exceptions import RequestException
+from contracts.contracts import LocationData, check_coordinates
+from core.config import (BATCH_MAX_WORKERS, CACHE_MIN_RECHECK, SERVER_BIND,
+                         SERVER_LOCATION_TTL, SERVER_MAX_LOCATIONS)
+from core.exceptions import LocationServerError, WeatherServerError
+from core.jobs import SingleFlight
+from core.metrics import metrics
+from core.ratelimit import BACKGROUND, priority
+from services.locationService import LocationService
+from services.weatherService import WeatherService
+
+
+class WeatherServer:
+    '''Serve weather to many clients with one upstream fetch per location.
+
+    GET /weather?lat=..&lon=..[&city=..&country=..], /weather?city=.. or /weather
+        LocAndWeatherPayload as json, for coordinates, a city or the server's ip
+    GET /location[?city=..]
+        LocationData as json, of a city or of the server's ip
+    GET /metrics
+
+    Weather is kept json encoded per cache key. Concurrent misses of a key
+    share one upstream fetch, and expired entries are served as they are
+    while a single background fetch revalidates them.
+    '''
+
+    def __init__(
+        self,
+        location_service: LocationService | None = None,
+        weather_service: WeatherService | None = None,
+        max_locations: int = SERVER_MAX_LOCATIONS,
+    ):
+        self.location_service = location_service or LocationService()
+        self.weather_service = weather_service or WeatherService()
+        self.max_locations = max_locations
+
+        self.flight = SingleFlight()
+        self.executor = ThreadPoolExecutor(
+            max_workers=BATCH_MAX_WORKERS, thread_name_prefix='revalidate')
+        self._lock = threading.Lock()
+        self._weather: OrderedDict[tuple, tuple[bytes, float]] = OrderedDict()
+        self._location: tuple[LocationData, float] | None = None
+
+    def weather(self, location: LocationData) -> tuple[bytes, float]:
+        '''Return json encoded WeatherData of location and the unix time it expires.'''
+        key = self.weather_service.cache.key(location)
+        with self._lock:
+            cached = self._weather.get(key)
+            if cached is not None:
+                self._weather.move_to_end(key)
+
+        if cached is None:
+            metrics.increment('server.miss')
+            return self.flight.do(key, self._fetch_weather, key, location)
+
+        if cached[1] > time.time():
+            metrics.increment('server.hit')
+        else:
+            metrics.increment('server.stale')
+            if not self.flight.in_flight(key):
+                self.executor.submit(self._revalidate, key, location)
+        return cached
+
+    def location(self, city: str | None = None) -> LocationData:
+        '''Return location of city, or of the server's ip when city is None.'''
+        if city:
+            return self.flight.do(
+                ('city', city.strip().casefold()), self._fetch_city, city)
+
+        cached = self._location
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        return self.flight.do(('ip',), self._fetch_ip_location)
+
+    def _fetch_weather(self, key: tuple, location: LocationData) -> tuple[bytes, float]:
+        weather = self.weather_service.get(location)
+
+        now = time.time()
+        expires_at = self.weather_service.expires_at(location) or now
+        if not weather.flag:
+            # served from the fallback, retry no sooner than a healthy recheck
+            expires_at = max(expires_at, now + CACHE_MIN_RECHECK)
+
+        encoded = (
+            json.dumps(dataclasses.asdict(weather), default=list).encode(),
+            expires_at,
+        )
+
+        with self._lock:
+            self._weather[key] = encoded
+            self._weather.move_to_end(key)
+            while len(self._weather) > self.max_locations:
+                self._weather.popitem(last=False)
+        return encoded
+
+    def _revalidate(self, key: tuple, location: LocationData) -> None:
+        try:
+            # clients are served meanwhile, their misses go first
+            with priority(BACKGROUND):
+                self.flight.do(key, self._fetch_weather, key, location)
+        except WeatherServerError as error:
+            logger = logging.getLogger('app')
+            logger.warning(f'Server: revalidating {location.city} failed, {error}')
+
+    def _fetch_city(self, city: str) -> LocationData:
+        location = self.location_service.city_index.resolve(city)
+        if location is not None:
+            return location
+
+        data = self.location_service.request_city(city)[0]
+        return LocationData(
+            country=data['country'],
+            city=data['name'],
+            lat=float(data['lat']),
+            lon=float(data['lon']),
+        )
+
+    def _fetch_ip_location(self) -> LocationData:
+        location = self.location_service.fetch_current()
+        self._location = (location, time.time() + SERVER_LOCATION_TTL)
+        return location
+
+    def respond(self, path: str, query: dict[str, str]) -> tuple[int, bytes, float]:
+        '''Return status, json body and max-age, in sec, answering GET path?query.'''
+        if path == '/weather':
+            if 'lat' in query:
+                location = LocationData(
+                    country=query.get('country', ''),
+                    city=query.get('city', ''),
+                    lat=float(query['lat']),
+                    lon=float(query['lon']),
+                )
+                # a NaN key never matches the cache or a flight, each request would go upstream
+                check_coordinates(location.lat, location.lon)
+            else:
+                location = self.location(query.get('city'))
+
+            weather, expires_at = self.weather(location)
+            body = b'{"location_data": %s, "weather_data": %s}' % (
+                json.dumps(dataclasses.asdict(location)).encode(), weather)
+            return 200, body, max(0.0, expires_at - time.time())
+
+        if path == '/location':
+            location = self.location(query.get('city'))
+            return 200, json.dumps(dataclasses.asdict(location)).encode(), 0.0
+
+        if path == '/metrics':
+            return 200, json.dumps(metrics.snapshot()).encode(), 0.0
+
+        return 404, b'{"error": "not found"}', 0.0
+
+    def listen(self, port: int, host: str = SERVER_BIND) -> ThreadingHTTPServer:
+        '''Return an HTTP server answering with respond, not started yet.'''
+        weather_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive for polling clients
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {
+                    name: values[-1] for name, values in parse_qs(url.query).items()
+                }
+                try:
+                    with metrics.span('server.respond'):
+                        status, body, max_age = weather_server.respond(
+                            url.path.rstrip('/') or '/', query)
+                except (KeyError, ValueError) as error:
+                    status, body, max_age = 400, _error(error), 0.0
+                except LocationServerError as error:
+                    status, body, max_age = 404, _error(error), 0.0
+                except (WeatherServerError, RequestException) as error:
+                    status, body, max_age = 502, _error(error), 0.0
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', f'max-age={int(max_age)}')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+
+        logger = logging.getLogger('app')
+        logger.info(f'Server: serving weather on http://{host}:{server.server_address[1]}/')
+        return server
+
+
+def _error(error: Exception) -> bytes:
+    return json.dumps({'error': f'{type(error).__name__}: {error}'}).encode()
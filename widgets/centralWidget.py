@@ -2,6 +2,7 @@
 from PyQt5 import QtWidgets
 from contracts.contracts import *
 from core.config import *
+from core.metrics import metrics
 from widgets.weatherWidget import WeatherWidget
 from widgets.locationWidget import LocationWidget
 from widgets.infoWidget import InfoWidget
@@ -15,14 +16,19 @@ class CentralWidget(QtWidgets.QFrame):
         layout.setContentsMargins(10, 10, 10, 10)
         layout.setSpacing(10)
 
-        layout.addWidget(LocationWidget())
-        layout.addWidget(WeatherWidget())
+        self.locationWidget = LocationWidget()
+        self.todayWeatherWidget = WeatherWidget()
+        layout.addWidget(self.locationWidget)
+        layout.addWidget(self.todayWeatherWidget)
         layout.addWidget(InfoWidget())
 
+        self._data: LocAndWeatherPayload | None = None
+
+    @metrics.timed('widget.update')
     def update(self, data: LocAndWeatherPayload):
-        todayWeatherWidget = self.findChild(
-            QtWidgets.QWidget, 'todayWeatherWidget')
-        todayWeatherWidget.update(data.weather_data)
+        if data == self._data:
+            return
 
-        locationWidget = self.findChild(QtWidgets.QWidget, 'locationWidget')
-        locationWidget.update(data.location_data)
+        self.todayWeatherWidget.update(data.weather_data)
+        self.locationWidget.update(data.location_data)
+        self._data = data
@@ -0,0 +1,27 @@
+from PyQt5 import QtCore, QtWidgets
+from services.cityIndex import CityIndex
+
+
+class CityCompleter(QtWidgets.QCompleter):
+    '''As-you-type "city, CC" suggestions served by the local city index.'''
+
+    def __init__(self, city_index: CityIndex, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.city_index = city_index
+
+        self.suggestionsModel = QtCore.QStringListModel(self)
+        self.setModel(self.suggestionsModel)
+        self.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        # the index already matched the prefix, accents and all
+        self.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+
+    def attach(self, line_edit: QtWidgets.QLineEdit) -> None:
+        line_edit.setCompleter(self)
+        line_edit.textEdited.connect(self.update_suggestions)
+
+    def update_suggestions(self, text: str) -> None:
+        self.suggestionsModel.setStringList(self.city_index.suggestions(text))
+        if self.suggestionsModel.rowCount():
+            self.complete()
+        else:
+            self.popup().hide()
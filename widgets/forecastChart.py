@@ -0,0 +1,179 @@
+import calendar
+import math
+from dataclasses import dataclass
+from PyQt5 import QtCore, QtGui, QtWidgets
+from contracts.contracts import ForecastSeries, local_datetime
+from core.config import FORECAST_CHART_HEIGHT
+from core.metrics import metrics
+
+DAY = 24 * 60 * 60  # time, in sec
+
+GRID_LINES = 4  # intervals between horizontal gridlines
+MARGINS = QtCore.QMarginsF(34, 6, 34, 18)  # left: probability axis, right: temperature axis, bottom: weekdays
+MIN_LABEL_WIDTH = 24  # size, in px, of a day below which its weekday is left out
+BAR_WIDTH = 0.6  # fraction of a step covered by its probability bar
+STALE_OPACITY = 0.45  # opacity, 0 to 1, of the data layer while the data is stale
+
+GRID_COLOR = QtGui.QColor(255, 255, 255, 70)
+TEXT_COLOR = QtGui.QColor(255, 255, 255)
+TEMP_COLOR = QtGui.QColor(255, 196, 92)
+POP_COLOR = QtGui.QColor(144, 238, 233, 120)
+
+
+@dataclass(frozen=True, slots=True)
+class ChartLayer:
+    '''Data layer of a series laid out in widget coordinates.'''
+    line: QtGui.QPolygonF
+    bars: list[QtCore.QRectF]
+    days: list[QtCore.QLineF]
+    labels: list[tuple[QtCore.QRectF, int, str]]
+
+
+def temperature_range(temp) -> tuple[int, int]:
+    '''Return whole degree bounds around temp with a whole degree step between gridlines.'''
+    low, high = math.floor(min(temp)), math.ceil(max(temp))
+    step = max(1, math.ceil((high - low) / GRID_LINES))
+    return low, low + step * GRID_LINES
+
+
+class ForecastChart(QtWidgets.QWidget):
+    '''Temperature line over precipitation probability bars of every forecast step.
+
+    Gridlines and the probability axis are painted into a pixmap once per
+    size. The data layer is laid out when the series or the size changes
+    and drawn over that pixmap on every paint.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.setObjectName('forecastChart')
+        self.setMinimumHeight(FORECAST_CHART_HEIGHT)
+
+        font = self.font()
+        font.setPointSizeF(8)
+        self.setFont(font)
+
+        self._series: ForecastSeries | None = None
+        self._flag = True
+        self._static: QtGui.QPixmap | None = None
+        self._layer: ChartLayer | None = None
+
+    def update(self, series: ForecastSeries | None, flag: bool):
+        if series == self._series and flag == self._flag:
+            return
+
+        self._series = series
+        self._flag = flag
+        self._layer = None
+        super().update()
+
+    def resizeEvent(self, event):
+        self._static = None
+        self._layer = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        with metrics.span('chart.paint'):
+            if self._static is None:
+                self._static = self._paint_static()
+
+            painter = QtGui.QPainter(self)
+            painter.drawPixmap(0, 0, self._static)
+
+            if self._series:
+                if self._layer is None:
+                    self._layer = self._lay_out(self._series)
+                self._paint_data(painter, self._layer)
+            painter.end()
+
+    def _plot(self) -> QtCore.QRectF:
+        return QtCore.QRectF(self.rect()).marginsRemoved(MARGINS)
+
+    def _paint_static(self) -> QtGui.QPixmap:
+        metrics.increment('chart.static')
+        ratio = self.devicePixelRatioF()
+        pixmap = QtGui.QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QtCore.Qt.transparent)
+
+        plot = self._plot()
+        painter = QtGui.QPainter(pixmap)
+        painter.setFont(self.font())
+        for line in range(GRID_LINES + 1):
+            y = plot.top() + plot.height() * line / GRID_LINES
+            painter.setPen(GRID_COLOR)
+            painter.drawLine(QtCore.QLineF(plot.left(), y, plot.right(), y))
+            painter.setPen(TEXT_COLOR)
+            painter.drawText(
+                QtCore.QRectF(0, y - 8, MARGINS.left() - 4, 16),
+                QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
+                f'{100 - 100 * line // GRID_LINES}%',
+            )
+        painter.end()
+        return pixmap
+
+    def _lay_out(self, series: ForecastSeries) -> ChartLayer:
+        plot = self._plot()
+        start, end = series.dt[0], series.dt[-1]
+        step = (end - start) / (len(series) - 1) if len(series) > 1 else 3 * 60 * 60
+        scale = plot.width() / (end - start + step)  # px per sec, half a step of room at both ends
+
+        def x(dt: int) -> float:
+            return plot.left() + (dt - start + step / 2) * scale
+
+        low, high = temperature_range(series.temp)
+        line = QtGui.QPolygonF([
+            QtCore.QPointF(x(dt), plot.bottom() - (temp - low) / (high - low) * plot.height())
+            for dt, temp in zip(series.dt, series.temp)
+        ])
+
+        width = step * scale * BAR_WIDTH
+        bars = [
+            QtCore.QRectF(x(dt) - width / 2, plot.bottom() - pop * plot.height(), width, pop * plot.height())
+            for dt, pop in zip(series.dt, series.pop) if pop > 0
+        ]
+
+        labels = []
+        for line_index in range(GRID_LINES + 1):
+            y = plot.top() + plot.height() * line_index / GRID_LINES
+            labels.append((
+                QtCore.QRectF(plot.right() + 4, y - 8, MARGINS.right() - 4, 16),
+                QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                f'{high - (high - low) * line_index // GRID_LINES}\N{DEGREE SIGN}',
+            ))
+
+        # a line at each local midnight, the weekday after it
+        days = []
+        midnight = (start + series.tz_offset) // DAY * DAY - series.tz_offset
+        while midnight <= end:
+            left, right = max(x(midnight), plot.left()), min(x(midnight + DAY), plot.right())
+            if midnight > start:
+                days.append(QtCore.QLineF(left, plot.top(), left, plot.bottom()))
+            if right - left >= MIN_LABEL_WIDTH:  # no room on a day cut short by the series
+                weekday = local_datetime(max(midnight, start), series.tz_offset).weekday()
+                labels.append((
+                    QtCore.QRectF(left + 3, plot.bottom(), right - left - 3, MARGINS.bottom()),
+                    QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                    calendar.day_abbr[weekday],
+                ))
+            midnight += DAY
+
+        return ChartLayer(line=line, bars=bars, days=days, labels=labels)
+
+    def _paint_data(self, painter: QtGui.QPainter, layer: ChartLayer) -> None:
+        painter.setOpacity(1.0 if self._flag else STALE_OPACITY)
+
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(POP_COLOR)
+        painter.drawRects(layer.bars)
+
+        painter.setPen(QtGui.QPen(GRID_COLOR, 1, QtCore.Qt.DashLine))
+        painter.drawLines(layer.days)
+
+        painter.setPen(TEXT_COLOR)
+        for rect, flags, text in layer.labels:
+            painter.drawText(rect, flags, text)
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(QtGui.QPen(TEMP_COLOR, 2))
+        painter.drawPolyline(layer.line)
@@ -0,0 +1,78 @@
+import logging
+import os
+from PyQt5 import QtCore, QtGui
+from contracts.bundle import IconBundle
+from core.config import (CURRENT_ICON_SCALE, CURRENT_ICON_SIZE, FORECAST_ICON_SCALE,
+                         ICON_BUNDLE_FILE, ICON_DIR, ICON_IDS)
+from core.exceptions import eprint, BundleError
+from core.metrics import metrics
+from core.utils import resource
+
+
+class IconCache:
+    '''Decoded and pre-scaled icon pixmaps, shared across refreshes and windows.
+
+    Icons are decoded from the memory-mapped bundle, or from the icon files
+    in directory when the bundle is missing or does not hold them. The
+    bundle is mapped on the first icon decoded, not on import.
+    '''
+
+    def __init__(self, directory: str = ICON_DIR, bundle: str | None = ICON_BUNDLE_FILE):
+        self.directory = directory
+        self.bundle_path = bundle
+        self._bundle: IconBundle | None = None
+        self._opened = bundle is None
+        self._pixmaps: dict[tuple[str, str, int | None], QtGui.QPixmap] = {}
+
+    @property
+    def bundle(self) -> IconBundle | None:
+        '''Bundle at bundle_path, opened once, None when missing or unreadable.'''
+        if not self._opened:
+            self._bundle = self._open(self.bundle_path)
+            self._opened = True
+        return self._bundle
+
+    @staticmethod
+    def _open(path: str | None) -> IconBundle | None:
+        if path is None:
+            return None
+        try:
+            return IconBundle(resource(path))
+        except FileNotFoundError:
+            logger = logging.getLogger('app')
+            logger.info(f'Icons: no bundle at {path}, reading icon files')
+        except (OSError, ValueError, BundleError) as error:
+            eprint(error)
+        return None
+
+    def get(self, icon: str, scale: str = '', size: int | None = None) -> QtGui.QPixmap:
+        '''Return pixmap of icon file variant scale, fitted into size x size if given.'''
+        key = (icon, scale, size)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None:
+            pixmap = self._load(f'{icon}{scale}.png')
+            if size is not None:
+                pixmap = pixmap.scaled(size, size, QtCore.Qt.KeepAspectRatio)
+            self._pixmaps[key] = pixmap
+
+        return pixmap
+
+    def _load(self, name: str) -> QtGui.QPixmap:
+        bundle = self.bundle
+        content = None if bundle is None else bundle.get(name)
+        if content is None:
+            metrics.increment('icons.file_read')
+            return QtGui.QPixmap(resource(os.path.join(self.directory, name)))
+
+        pixmap = QtGui.QPixmap()
+        pixmap.loadFromData(content, 'PNG')
+        return pixmap
+
+    def warm_up(self) -> None:
+        '''Decode every icon variant used by the weather widgets.'''
+        for icon in ICON_IDS:
+            self.get(icon, CURRENT_ICON_SCALE, CURRENT_ICON_SIZE)
+            self.get(icon, FORECAST_ICON_SCALE)
+
+
+icon_cache = IconCache()
@@ -2,6 +2,7 @@
 from PyQt5 import QtCore, QtWidgets
 
 from services.locationService import LocationData
+from widgets.render import set_text
 
 
 class LocationWidget(QtWidgets.QWidget):
@@ -16,14 +17,14 @@ class LocationWidget(QtWidgets.QWidget):
         layout.setContentsMargins(0, 10, 0, 10)
         layout.setSpacing(0)
 
-        locationLabel = QtWidgets.QLabel(text=f'', parent=self)
-        locationLabel.setObjectName('locationLabel')
-        locationLabel.setAlignment(
+        self.locationLabel = QtWidgets.QLabel(text=f'', parent=self)
+        self.locationLabel.setObjectName('locationLabel')
+        self.locationLabel.setAlignment(
             QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-        layout.addWidget(locationLabel)
+        layout.addWidget(self.locationLabel)
 
     def update(self, data: LocationData):
-        locationLabel = self.findChild(QtWidgets.QLabel, 'locationLabel')
-        locationLabel.setText(
+        set_text(
+            self.locationLabel,
             f'{data.city}, {data.country}'
         )
@@ -0,0 +1,23 @@
+
+from PyQt5 import QtGui, QtWidgets
+
+
+def set_text(label: QtWidgets.QLabel, text: str) -> None:
+    '''Set label text only when it differs from what is on screen.'''
+    if label.text() != text:
+        label.setText(text)
+
+
+def set_pixmap(label: QtWidgets.QLabel, pixmap: QtGui.QPixmap) -> None:
+    '''Set label pixmap only when it is a different image than the one shown.'''
+    current = label.pixmap()
+    if current is None or current.cacheKey() != pixmap.cacheKey():
+        label.setPixmap(pixmap)
+
+
+def set_property(widget: QtWidgets.QWidget, name: str, value: bool) -> None:
+    '''Set a property style sheet selectors match on, restyling widget only when it changes.'''
+    if widget.property(name) != value:
+        widget.setProperty(name, value)
+        widget.style().unpolish(widget)
+        widget.style().polish(widget)
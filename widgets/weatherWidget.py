@@ -1,8 +1,10 @@
 
-import os
-from PyQt5 import QtCore, QtGui, QtWidgets
-from core.config import FORECAST_DAYS_SPAN
+from PyQt5 import QtCore, QtWidgets
+from core.config import CURRENT_ICON_SCALE, CURRENT_ICON_SIZE, FORECAST_DAYS_SPAN, FORECAST_ICON_SCALE
 from services.weatherService import WeatherData, WeatherDataCurrent, WeatherDataForecast
+from widgets.forecastChart import ForecastChart
+from widgets.iconCache import icon_cache
+from widgets.render import set_pixmap, set_property, set_text
 
 
 class WeatherWidget(QtWidgets.QWidget):
@@ -14,16 +16,17 @@ class WeatherWidget(QtWidgets.QWidget):
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.setContentsMargins(0, 10, 0, 10)
         self.layout.setSpacing(20)
-        self.layout.addWidget(CurrentWeatherFrame())
-        self.layout.addWidget(ForecastWeatherFrame())
+        self.currentWeatherFrame = CurrentWeatherFrame()
+        self.forecastWeatherFrame = ForecastWeatherFrame()
+        self.forecastChart = ForecastChart()
+        self.layout.addWidget(self.currentWeatherFrame)
+        self.layout.addWidget(self.forecastWeatherFrame)
+        self.layout.addWidget(self.forecastChart)
 
     def update(self, data: WeatherData):
-        weatherWidget = self.findChild(QtWidgets.QFrame, 'currentWeatherFrame')
-        weatherWidget.update(data.current, data.flag)
-
-        forecastWidget = self.findChild(
-            QtWidgets.QFrame, 'forecastWeatherFrame')
-        forecastWidget.update(data.forecast, data.flag)
+        self.currentWeatherFrame.update(data.current, data.flag)
+        self.forecastWeatherFrame.update(data.forecast, data.flag)
+        self.forecastChart.update(data.series, data.flag)
 
 
 class CurrentWeatherFrame(QtWidgets.QFrame):
@@ -37,61 +40,66 @@ class CurrentWeatherFrame(QtWidgets.QFrame):
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
 
-        iconLabel = QtWidgets.QLabel(text=f'', parent=self)
-        iconLabel.setObjectName('iconLabel')
-        iconLabel.setAlignment(QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-        layout.addWidget(iconLabel)
+        self.iconLabel = QtWidgets.QLabel(text=f'', parent=self)
+        self.iconLabel.setObjectName('iconLabel')
+        self.iconLabel.setAlignment(
+            QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
+        layout.addWidget(self.iconLabel)
 
-        descriptionLabel = QtWidgets.QLabel(text=f'', parent=self)
-        descriptionLabel.setObjectName('descriptionLabel')
-        descriptionLabel.setAlignment(
+        self.descriptionLabel = QtWidgets.QLabel(text=f'', parent=self)
+        self.descriptionLabel.setObjectName('descriptionLabel')
+        self.descriptionLabel.setAlignment(
             QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-        layout.addWidget(descriptionLabel)
+        layout.addWidget(self.descriptionLabel)
 
-        temperatureLabel = QtWidgets.QLabel(text=f'', parent=self)
-        temperatureLabel.setObjectName('temperatureLabel')
-        temperatureLabel.setAlignment(
+        self.temperatureLabel = QtWidgets.QLabel(text=f'', parent=self)
+        self.temperatureLabel.setObjectName('temperatureLabel')
+        self.temperatureLabel.setAlignment(
             QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-        layout.addWidget(temperatureLabel)
+        layout.addWidget(self.temperatureLabel)
 
-        feelsLikeLabel = QtWidgets.QLabel(text=f'', parent=self)
-        feelsLikeLabel.setObjectName('feelsLikeLabel')
-        feelsLikeLabel.setAlignment(
+        self.feelsLikeLabel = QtWidgets.QLabel(text=f'', parent=self)
+        self.feelsLikeLabel.setObjectName('feelsLikeLabel')
+        self.feelsLikeLabel.setAlignment(
             QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-        layout.addWidget(feelsLikeLabel)
+        layout.addWidget(self.feelsLikeLabel)
 
-        lastUpdatedLabel = QtWidgets.QLabel(text='', parent=self)
-        lastUpdatedLabel.setObjectName('lastUpdatedLabel')
-        lastUpdatedLabel.setAlignment(
+        self.lastUpdatedLabel = QtWidgets.QLabel(text='', parent=self)
+        self.lastUpdatedLabel.setObjectName('lastUpdatedLabel')
+        self.lastUpdatedLabel.setAlignment(
             QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-        layout.addWidget(lastUpdatedLabel)
+        layout.addWidget(self.lastUpdatedLabel)
 
     def update(self, data: WeatherDataCurrent, flag: bool):
 
         if data.icon is not None:
-            filename = os.path.join('.', 'icons', data.icon + '@4x.png')
-            pixmap = QtGui.QPixmap(filename)
-            pixmap = pixmap.scaled(512, 512, QtCore.Qt.KeepAspectRatio)
-
-            iconLabel = self.findChild(QtWidgets.QLabel, 'iconLabel')
-            iconLabel.setPixmap(pixmap)
+            set_pixmap(
+                self.iconLabel,
+                icon_cache.get(data.icon, CURRENT_ICON_SCALE, CURRENT_ICON_SIZE)
+            )
+        else:
+            self.iconLabel.clear()
 
-        descriptionLabel = self.findChild(QtWidgets.QLabel, 'descriptionLabel')
-        descriptionLabel.setText(
+        set_text(
+            self.descriptionLabel,
             f'<strong>{data.description.capitalize()}</strong>'
         )
 
-        temperatureLabel = self.findChild(QtWidgets.QLabel, 'temperatureLabel')
-        temperatureLabel.setText(
+        set_text(
+            self.temperatureLabel,
             f'<strong>{data.t:.0f}</strong> <span>&#8451;</span>'
         )
 
-        feelsLikeLabel = self.findChild(QtWidgets.QLabel, 'feelsLikeLabel')
-        feelsLikeLabel.setText(
+        set_text(
+            self.feelsLikeLabel,
             f'Feels like: <strong>{data.t_feels_like:.0f}</strong> <span>&#8451;</span>')
 
-        lastUpdatedLabel = self.findChild(QtWidgets.QLabel, 'lastUpdatedLabel')
-        lastUpdatedLabel.setText(f'Last updated: {data.dt}')
+        # stale until upstream confirms it: last run's snapshot or a fallback
+        set_text(
+            self.lastUpdatedLabel,
+            f'Last updated: {data.local_time}' + ('' if flag else ' (stale)')
+        )
+        set_property(self.lastUpdatedLabel, 'stale', not flag)
 
 
 class ForecastWeatherFrame(QtWidgets.QFrame):
@@ -101,9 +109,12 @@ class ForecastWeatherFrame(QtWidgets.QFrame):
         self.layout = QtWidgets.QHBoxLayout(self)
         self.layout.setSpacing(20)
 
+        self.dayFrames: list[QtWidgets.QFrame] = []
+        self.dayLabels: list[dict[str, QtWidgets.QLabel]] = []
         for day in range(1, FORECAST_DAYS_SPAN):
             frame = QtWidgets.QFrame(self)
             self.layout.addWidget(frame)
+            self.dayFrames.append(frame)
             layout = QtWidgets.QVBoxLayout(frame)
             layout.setContentsMargins(0, 0, 0, 0)
             layout.setSpacing(0)
@@ -138,35 +149,43 @@ class ForecastWeatherFrame(QtWidgets.QFrame):
                 QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
             layout.addWidget(popLabel)
 
-    def update(self, data: tuple[WeatherDataForecast], flag: bool):
-        for day in range(1, FORECAST_DAYS_SPAN):
-            dayInfo = data[day-1]
+            self.dayLabels.append({
+                'weekday': weekdayLabel,
+                'icon': iconLabel,
+                'maxTemp': maxTempLabel,
+                'minTemp': minTempLabel,
+                'pop': popLabel,
+            })
 
-            weekdayLabel = self.findChild(
-                QtWidgets.QLabel, f'{day}weekdayLabel')
-            weekdayLabel.setText(
-                f'<strong>{dayInfo.weekday.capitalize(
-                )}</strong><br>{dayInfo.date}'
+    def update(self, data: tuple[WeatherDataForecast], flag: bool):
+        # days past the end of data are hidden, not left with an earlier forecast
+        for day, frame in enumerate(self.dayFrames):
+            if frame.isHidden() != (day >= len(data)):
+                frame.setHidden(day >= len(data))
+
+        for labels, dayInfo in zip(self.dayLabels, data):
+            set_text(
+                labels['weekday'],
+                f'<strong>{dayInfo.weekday.capitalize()}</strong><br>{dayInfo.date}'
             )
 
             if dayInfo.midday_icon is not None:
-                filename = os.path.join('.', 'icons', dayInfo.midday_icon + '.png')
-                pixmap = QtGui.QPixmap(filename)
-                iconLabel = self.findChild(QtWidgets.QLabel, f'{day}iconLabel')
-                iconLabel.setPixmap(pixmap)
-
-            maxTempLabel = self.findChild(
-                QtWidgets.QLabel, f'{day}maxTempLabel')
-            maxTempLabel.setText(
+                set_pixmap(
+                    labels['icon'],
+                    icon_cache.get(dayInfo.midday_icon, FORECAST_ICON_SCALE)
+                )
+            else:
+                labels['icon'].clear()
+
+            set_text(
+                labels['maxTemp'],
                 f'Max: <strong>{dayInfo.temp_max:.0f}</strong> <span>&#8451;</span>')
 
-            minTempLabel = self.findChild(
-                QtWidgets.QLabel, f'{day}minTempLabel')
-            minTempLabel.setText(
-                f'Min: <strong>{
-                    dayInfo.temp_min:.0f}</strong> <span>&#8451;</span>'
+            set_text(
+                labels['minTemp'],
+                f'Min: <strong>{dayInfo.temp_min:.0f}</strong> <span>&#8451;</span>'
             )
 
-            popLabel = self.findChild(QtWidgets.QLabel, f'{day}popLabel')
-            popLabel.setText(f'Precipitation: <strong>{
-                             f'{float(dayInfo.max_day_pop) * 100:.0f}'}</strong>%')
+            set_text(
+                labels['pop'],
+                f'Precipitation: <strong>{float(dayInfo.max_day_pop) * 100:.0f}</strong>%')